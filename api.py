@@ -0,0 +1,216 @@
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+
+from models import Venue, Artist
+from scheduling import ScheduleError, schedule_shows
+from search import prefix_index
+from export import MODELS, export_lines, gzip_stream
+from catalog import (
+    catalog_filters,
+    venue_list,
+    venue_row,
+    venue_detail,
+    artist_list,
+    artist_detail,
+    search_results,
+    show_list,
+    show_row,
+    parse_cursor
+)
+
+#----------------------------------------------------------------------------#
+# JSON API, version 1.
+#
+# Detail and search endpoints return one JSON document with the same data as
+# the HTML pages. List endpoints stream NDJSON (one JSON object per line)
+# ordered by a cursor: pass the cursor fields of the last row received as
+# `after` (and `after_id` for shows) to continue, and `limit` to cap a page.
+# Without a limit the rest of the table is streamed.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__)
+
+
+def to_json(value):
+    return json.dumps(value, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+
+
+def json_response(value):
+    return Response(to_json(value), mimetype='application/json')
+
+
+def ndjson_response(query, row):
+    # rows are fetched in batches and written out as they arrive
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        query = query.limit(max(limit, 0))
+    rows = query.yield_per(current_app.config['API_STREAM_BATCH_SIZE'])
+
+    def lines():
+        # the request's session is removed before the response is
+        # streamed; close the query's own session at the end, or its
+        # connection stays checked out of the pool
+        try:
+            for result in rows:
+                yield to_json(row(result)) + '\n'
+        finally:
+            rows.session.close()
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+
+
+def past_page():
+    return max(request.args.get('past_page', 1, type=int), 1)
+
+
+def search_page():
+    return request.args.get('search_term', ''), max(request.args.get('page', 1, type=int), 1)
+
+
+def list_filters(model):
+    # optional genre, city and state filters, e.g. ?genre=Jazz&city=San Francisco
+    return catalog_filters(model, **{name: request.args.get(name) for name in ('genre', 'city', 'state')})
+
+
+@api.errorhandler(400)
+def bad_request(error):
+    return json_response({"error": "bad request"}), 400
+
+
+@api.errorhandler(404)
+def not_found(error):
+    return json_response({"error": "not found"}), 404
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+def venues():
+    # cursor: venue id
+    venues = venue_list(*list_filters(Venue))
+    after = request.args.get('after', type=int)
+    if after is not None:
+        venues = venues.filter(Venue.id > after)
+    return ndjson_response(venues.order_by(Venue.id), venue_row)
+
+
+@api.route('/venues/search')
+def search_venues():
+    search_term, page = search_page()
+    return json_response(search_results(Venue, search_term, page, request.args.get('genre')))
+
+
+@api.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+    data = venue_detail(venue_id, past_page(), datetime.now())
+    if data is None:
+        abort(404)
+    return json_response(data)
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@api.route('/artists')
+def artists():
+    # cursor: artist id
+    artists = artist_list(*list_filters(Artist))
+    after = request.args.get('after', type=int)
+    if after is not None:
+        artists = artists.filter(Artist.id > after)
+    return ndjson_response(artists.order_by(Artist.id), lambda artist: artist._asdict())
+
+
+@api.route('/artists/search')
+def search_artists():
+    search_term, page = search_page()
+    return json_response(search_results(Artist, search_term, page, request.args.get('genre')))
+
+
+@api.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+    data = artist_detail(artist_id, past_page(), datetime.now())
+    if data is None:
+        abort(404)
+    return json_response(data)
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api.route('/shows')
+def shows():
+    # cursor: start_time (ISO 8601) and id of the show
+    after = request.args.get('after')
+    if after is not None:
+        after = parse_cursor(after)
+        if after is None:
+            abort(400)
+    shows = show_list(after, request.args.get('after_id', type=int))
+    return ndjson_response(shows, lambda show: dict(id=show.id, **show_row(show)))
+
+
+@api.route('/shows/batch', methods=['POST'])
+def create_shows():
+    # {"shows": [{"venue_id": 1, "artist_id": 2, "start_time": "2026-05-01T20:00:00"}, ...]};
+    # all are listed in one transaction, or none with 409 and the problems
+    body = request.get_json(silent=True) or {}
+    try:
+        shows = [{
+            "venue_id": int(show['venue_id']),
+            "artist_id": int(show['artist_id']),
+            "start_time": datetime.fromisoformat(show['start_time'])
+        } for show in body['shows']]
+    except (KeyError, TypeError, ValueError):
+        abort(400)
+    if not shows:
+        abort(400)
+
+    try:
+        created = schedule_shows(shows)
+    except ScheduleError as error:
+        return json_response({"error": "not scheduled", "problems": error.problems}), 409
+    return json_response({"created": [show.id for show in created]}), 201
+
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@api.route('/autocomplete/<kind>')
+def autocomplete(kind):
+    # ?q=wild -> [{"id": 6, "name": "The Wild Sax Band"}, ...]
+    model = {'venues': Venue, 'artists': Artist}.get(kind)
+    if model is None:
+        abort(404)
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    response = json_response(prefix_index.complete(model, request.args.get('q', ''), limit))
+    response.cache_control.max_age = current_app.config['AUTOCOMPLETE_MAX_AGE']
+    return response
+
+#  Export
+#  ----------------------------------------------------------------
+
+@api.route('/export/<kind>')
+def export(kind):
+    # whole table as NDJSON or CSV (format=csv), optionally only rows written
+    # after `since`; gzip-compressed when the client accepts it
+    if kind not in MODELS:
+        abort(404)
+    format = request.args.get('format', 'ndjson')
+    if format not in ('ndjson', 'csv'):
+        abort(400)
+    since = request.args.get('since')
+    if since is not None:
+        since = parse_cursor(since)
+        if since is None:
+            abort(400)
+
+    lines = export_lines(MODELS[kind], format, since)
+    mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    if 'gzip' in request.accept_encodings:
+        response = Response(stream_with_context(gzip_stream(lines)), mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(stream_with_context(lines), mimetype=mimetype)
+    response.headers['Content-Disposition'] = 'attachment; filename={}.{}'.format(kind, format)
+    response.vary.add('Accept-Encoding')
+    return response
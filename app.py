@@ -2,28 +2,41 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
 from flask import (
     Flask, 
     render_template, 
     request,   
-    Response, 
     flash, 
     redirect, 
-    url_for  
+    url_for,
+    abort
 )    
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import FlaskForm
-from forms import ShowForm, VenueForm, ArtistForm
-from flask_migrate import Migrate
-import copy
+from forms import ShowForm, ShowSeriesForm, VenueForm, ArtistForm
 from datetime import datetime
-from models import setup_db, Venue, Artist, Show
+from functools import lru_cache
+from models import setup_db, Venue, Artist, Genre
+from catalog import (
+  catalog_filters,
+  genre_names,
+  venue_areas,
+  venue_detail,
+  LETTERS,
+  artists_page,
+  artist_detail,
+  search_results,
+  shows_page,
+  parse_cursor
+)
+from cache import setup_cache, page_cache, conditional
+from scheduling import ScheduleError, schedule_shows, show_series
+from api import api
+from internal import internal
+from instrumentation import setup_instrumentation
+from scheduler import setup_scheduler
+from assets import setup_assets
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -33,25 +46,59 @@ app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 db = setup_db(app)
+setup_cache(app)
+setup_instrumentation(app)
+setup_scheduler(app)
+setup_assets(app)
+app.register_blueprint(api, url_prefix='/api/v1')
+app.register_blueprint(internal, url_prefix='/internal')
+if not app.config['LAZY_STARTUP']:
+  # CLI-only; serving processes started with LAZY_STARTUP skip the import
+  from commands import catalog_cli
+  app.cli.add_command(catalog_cli)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en') 
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+  # compile each babel pattern and locale once; babel is imported on first
+  # use, it is slow to import and only pages with dates need it
+  import babel.dates
+  return (
+    babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)),
+    babel.Locale.parse(locale)
+  )
+
+def parse_datetime(value):
+  # dateutil is imported on first use too
+  import dateutil.parser
+  return dateutil.parser.parse(value)
+
+@lru_cache(maxsize=4096)
+def format_datetime(value, format='medium', locale='en'):
+  # accepts datetime objects as well as strings; only strings get parsed
+  if not isinstance(value, datetime):
+    value = parse_datetime(value)
+  pattern, locale = datetime_pattern(format, locale)
+  return pattern.apply(value, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
-  
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
+def filter_args():
+  # genre, city and state listing filters from the query string
+  return {name: request.args.get(name) for name in ('genre', 'city', 'state') if request.args.get(name)}
+
 @app.route('/')
 def index():
   return render_template('pages/home.html')
@@ -61,41 +108,23 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional
+@page_cache.cached
 def venues():
   # TODO: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.  
   
-  city_list = db.session.query(Venue.city, Venue.state).distinct()
-  # list for storing venue data
-  data = []
-
-  for area in city_list:
-  # add venues for city or state    
-    venues = Venue.query.filter_by(city=area.city, state=area.state).all()
-    venue_data = []
-    
-    data.append ({  
-      "city" : area.city,
-      "state": area.state,
-      "venues": venue_data
-    })
-
-    for venue in venues: 
-    # get number of upcoming shows for each venue      
-      num_upcoming_shows = 0
-      shows_venue= Show.query.filter_by(venue_id=venue.id).all()
-      for show in shows_venue:
-        if show.start_time > datetime.now():
-          num_upcoming_shows = num_upcoming_shows + 1   
-
-      venue_data.append ({
-        "id": venue.id,
-        "name": venue.name,
-        "num_upcoming_shows": num_upcoming_shows     
-      }) 
+  # all venues with their upcoming show count, grouped into areas by city
+  # and state; optionally only one genre, city or state, e.g.
+  # /venues?genre=Jazz&city=San Francisco
+  filters = catalog_filters(Venue, **filter_args())
+  data, next_show = venue_areas(*filters)
 
-  
-  return render_template('pages/venues.html', areas=data);
+  # the counts change when the next upcoming show starts; roll-forward
+  # only clears the cache of the process it runs in
+  page_cache.expire_at(next_show)
+
+  return render_template('pages/venues.html', areas=data, genres=genre_names(), filters=filter_args());
   # return venues page with data
 
 @app.route('/venues/search', methods=['POST'])
@@ -104,88 +133,31 @@ def search_venues():
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
-  # get the user search term
-  search_term = request.form.get("search_term")
-  # find all venues matching search term
-  results = Venue.query.filter(Venue.name.ilike('%' + search_term + '%')).all()
-  data = []
-
-  response = {
-    "count": len(results),
-    "data": []
-  }  
-
-  for venue in results:
-    num_upcoming_shows = 0
-    shows_venue = Show.query.filter(Show.venue_id==venue.id).all()
-    for show in shows_venue:
-    # count the number of upcoming concerts for the venue      
-      if show.start_time > datetime.now():
-        num_upcoming_shows = num_upcoming_shows + 1
-
-    response['data'].append({
-      "id": venue.id,
-      "name": venue.name,
-      "num_upcoming_shows": num_upcoming_shows
-    })      
-
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get("search_term"))
+  # get the user search term and requested page of results
+  search_term = request.form.get("search_term", "")
+  page = max(request.form.get("page", 1, type=int), 1)
+  genre = request.form.get("genre") or None
+  response = search_results(Venue, search_term, page, genre)
+
+  return render_template('pages/search_venues.html', results=response, search_term=search_term, genre=genre)
   # return response with search results
 
 @app.route('/venues/<int:venue_id>')
+@conditional
+@page_cache.cached
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id  
   
-  #get a given venue
-  venue = Venue.query.filter_by(id=venue_id).first()
-
-  shows_venue = db.session.query(Artist, Show).join(Show).join(Venue).filter(
-    Show.venue_id == venue_id,
-    Show.artist_id == Artist.id
-  ).all()
-
-  upcoming_shows = []
-  past_shows = []
-
-  data = {
-    "id": venue.id,
-    "name": venue.name,
-    "genres": venue.genres,
-    "address": venue.address,
-    "city": venue.city,
-    "state": venue.state,
-    "phone": venue.phone,
-    "facebook_link": venue.facebook_link,
-    "image_link": venue.image_link,
-    "seeking_talent": venue.seeking_talent,
-    "seeking_description":  venue.seeking_description,
-    "website": venue.website,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows)
-  }
-
-  #for upcoming show add show details 
-  for artist, show in shows_venue:
-    if show.start_time > datetime.now():     
-        upcoming_shows.append({
-          "artist_id": artist.id,
-          "artist_name": artist.name,
-          "artist_image_link": artist.image_link,
-          "start_time": format_datetime(str(show.start_time))
-        })
-  
-  #for past show add show details 
-  for artist, show in shows_venue:
-    if show.start_time < datetime.now():      
-        past_shows.append({
-          "artist_id": artist.id,
-          "artist_name": artist.name,
-          "artist_image_link": artist.image_link,
-          "start_time": format_datetime(str(show.start_time))
-        })   
+  #get a given venue with its upcoming and past shows
+  past_page = max(request.args.get('past_page', 1, type=int), 1)
+  data = venue_detail(venue_id, past_page, datetime.now())
+  if data is None:
+    abort(404)
+
+  # the page changes when the next upcoming show starts
+  if data['upcoming_shows']:
+    page_cache.expire_at(data['upcoming_shows'][0]['start_time'])
 
   return render_template('pages/show_venue.html', venue=data)
   # return template with venue data
@@ -205,7 +177,7 @@ def create_venue_submission():
   # TODO: insert form data as a new Venue record in the db, instead
   # TODO: modify data to be the data object returned from db insertion  
   error = False
-  form = VenueForm()
+  form = VenueForm(request.form)
 
   try:  
     # create new venue from form data
@@ -215,7 +187,7 @@ def create_venue_submission():
         state=form.state.data, 
         address=form.address.data, 
         phone=form.phone.data, 
-        genres=form.genres.data, 
+        genres=Genre.named(form.genres.data), 
         facebook_link=form.facebook_link.data, 
         image_link=form.image_link.data, 
         website=form.website.data, 
@@ -231,7 +203,7 @@ def create_venue_submission():
   except: 
     # TODO: on unsuccessful db insert, flash an error instead.
     db.session.rollback()
-    flash('An error occurred. Venue ' + data.name + ' could not be listed.')    
+    flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')    
     # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
     # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/ 
   finally:
@@ -256,88 +228,58 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional
+@page_cache.cached
 def artists():
 # TODO: replace with real data returned from querying the database  
-  data = Artist.query.all()
-  return render_template('pages/artists.html', artists=data)
+  # a page of ids and names in name order, optionally under one letter,
+  # continuing after the (name, id) of the last artist seen (keyset)
+  letter = request.args.get('letter')
+  if letter is not None and letter not in LETTERS:
+    abort(400)
+  after = request.args.get('after')
+  after_id = request.args.get('after_id', type=int)
+
+  filters = filter_args()
+  data, cursor = artists_page(catalog_filters(Artist, **filters), letter, after, after_id)
+
+  # cursor for the next page, if there is one
+  next_page = None
+  if cursor:
+    next_page = url_for('artists', letter=letter, after=cursor[0], after_id=cursor[1], **filters)
+
+  return render_template('pages/artists.html', artists=data, genres=genre_names(), filters=filters,
+    letters=LETTERS, letter=letter, next_page=next_page)
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".   
-  search_term = request.form.get('search_term') 
-  results = Artist.query.filter(Artist.name.ilike('%' + search_term + '%')).all()
-  data: []
-
-  response = {
-    "count": len(results),
-    "data": []
-  } 
-  
-  for artist in results:
-    num_upcoming_shows = 0
-    shows_artist = Show.query.filter(Show.artist_id==artist.id).all()
-    for show in shows_artist:
-      if show.start_time > datetime.now():
-        num_upcoming_shows = num_upcoming_shows + 1
-
-    response['data'].append ({
-      "id": artist.id,
-      "name": artist.name,
-      "num_upcoming_shows": num_upcoming_shows 
-    })  
-  
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get("search_term"))
+  search_term = request.form.get('search_term', '')
+  page = max(request.form.get('page', 1, type=int), 1)
+  genre = request.form.get('genre') or None
+  response = search_results(Artist, search_term, page, genre)
+
+  return render_template('pages/search_artists.html', results=response, search_term=search_term, genre=genre)
   # return reponse with matching search results
 
 @app.route('/artists/<int:artist_id>')
+@conditional
+@page_cache.cached
 def show_artist(artist_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id  
   
-  # get a given artis 
-  artist = Artist.query.filter_by(id=artist_id).first()
-
-  shows_artist = db.session.query(Venue.name, Venue.image_link, Show.venue_id, Show.artist_id, Show.start_time).join(Show, Show.venue_id == Venue.id).filter(Show.artist_id == artist_id).all()
-  upcoming_shows = []
-  past_shows = []
-
-  # data for artist
-  data = {
-    "id": artist.id,
-    "name": artist.name,
-    "genres": artist.genres,
-    "city": artist.city,
-    "state": artist.state,
-    "phone": artist.phone,
-    "facebook_link": artist.facebook_link,
-    "image_link": artist.image_link,
-    "seeking_description":  artist.seeking_description,
-    "website": artist.website,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows)
-  }
-
-  for show in shows_artist:
-    if show.start_time > datetime.now():    
-        upcoming_shows.append({
-          "venue_id": show.venue_id,
-          "venue_name": show.name,
-          "venue_image_link": show.image_link,
-          "start_time": format_datetime(str(show.start_time))
-        })
-
-  for show in shows_artist:
-    if show.start_time < datetime.now():     
-        past_shows.append({
-          "venue_id": show.venue_id,
-          "venue_name": show.name,
-          "venue_image_link": show.image_link,
-          "start_time": format_datetime(str(show.start_time))
-        })    
+  # get a given artist with upcoming and past shows
+  past_page = max(request.args.get('past_page', 1, type=int), 1)
+  data = artist_detail(artist_id, past_page, datetime.now())
+  if data is None:
+    abort(404)
+
+  # the page changes when the next upcoming show starts
+  if data['upcoming_shows']:
+    page_cache.expire_at(data['upcoming_shows'][0]['start_time'])
 
   return render_template('pages/show_artist.html', artist=data)
   # return artist page with data
@@ -348,24 +290,21 @@ def show_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   artist = Artist.query.filter_by(id=artist_id).first_or_404()
-  form = ArtistForm(obj=artist)
-
-  if artist:
-    form = ArtistForm(
-      name=artist.name,
-      genres=artist.genres,      
-      city=artist.city,
-      state=artist.state,
-      phone=artist.phone,
-      facebook_link=artist.facebook_link,
-      image_link=artist.image_link,
-      website=artist.website    
-    )
-
-    return render_template('forms/edit_artist.html', form=form, artist=artist)
-    # return edit template with artist data
 
   # TODO: populate form with fields from artist with ID <artist_id>
+  form = ArtistForm(
+    name=artist.name,
+    genres=[genre.name for genre in artist.genres],
+    city=artist.city,
+    state=artist.state,
+    phone=artist.phone,
+    facebook_link=artist.facebook_link,
+    image_link=artist.image_link,
+    website=artist.website    
+  )
+
+  return render_template('forms/edit_artist.html', form=form, artist=artist)
+  # return edit template with artist data
 
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
@@ -378,7 +317,7 @@ def edit_artist_submission(artist_id):
 
   try:    
     artist.name = request.form['name']
-    artist.genres = request.form.getlist('genres')
+    artist.genres = Genre.named(request.form.getlist('genres'))
     artist.city = request.form['city']
     artist.state = request.form['state']
     artist.phone = request.form['phone']
@@ -398,23 +337,21 @@ def edit_artist_submission(artist_id):
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-  form = VenueForm()
-  venue = Venue.query.get(venue_id)
-
-  if venue:
-    form = VenueForm(
-      name=venue.name,
-      genres=venue.genres,
-      city=venue.city,
-      state=venue.state,
-      address=venue.address,
-      phone=venue.phone,
-      facebook_link=venue.facebook_link,
-      image_link=venue.image_link,
-      website=venue.website,
-    )
+  venue = Venue.query.filter_by(id=venue_id).first_or_404()
 
   # TODO: populate form with values from venue with ID <venue_id>
+  form = VenueForm(
+    name=venue.name,
+    genres=[genre.name for genre in venue.genres],
+    city=venue.city,
+    state=venue.state,
+    address=venue.address,
+    phone=venue.phone,
+    facebook_link=venue.facebook_link,
+    image_link=venue.image_link,
+    website=venue.website,
+  )
+
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
@@ -427,7 +364,7 @@ def edit_venue_submission(venue_id):
 
   try:
     venue.name = request.form['name']
-    venue.genres = request.form.getlist('genres')
+    venue.genres = Genre.named(request.form.getlist('genres'))
     venue.city = request.form['city']
     venue.state = request.form['state']
     venue.address = request.form['address']
@@ -462,7 +399,7 @@ def create_artist_submission():
   try:
     artist = Artist(
       name=request.form['name'],
-      genres=request.form.getlist('genres'),
+      genres=Genre.named(request.form.getlist('genres')),
       city=request.form['city'],
       state=request.form['state'],
       phone=request.form['phone'],
@@ -490,25 +427,29 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@conditional
+@page_cache.cached
 def shows(): 
   # displays list of shows at /shows
   # TODO: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.   
-  data = []
-  shows = Show.query.all()
-
-  for show in shows:
-  # get venue and artist information for show  
-    data.append({
-      "venue_id": show.venue_id,    
-      "venue_name": Venue.query.get(show.venue_id).name,
-      "artist_id": show.artist_id,
-      "artist_name": Artist.query.get(show.artist_id).name,
-      "artist_image_link":Artist.query.get(show.artist_id).image_link,
-      "start_time": format_datetime(str(show.start_time))
-    })
-
-  return render_template('pages/shows.html', shows=data)
+  # one joined query for a page of shows ordered by start time, continuing
+  # after the last show seen (keyset)
+  after = request.args.get('after')
+  after_id = request.args.get('after_id', type=int)
+  if after is not None:
+    after = parse_cursor(after)
+    if after is None:
+      abort(400)
+
+  data, cursor = shows_page(after, after_id)
+
+  # cursor for the next page, if there is one
+  next_page = None
+  if cursor:
+    next_page = url_for('shows', after=cursor[0].isoformat(), after_id=cursor[1])
+
+  return render_template('pages/shows.html', shows=data, next_page=next_page)
   # return shows page with show data
 
                          
@@ -527,14 +468,15 @@ def create_show_submission():
   form = ShowForm()
 
   try:
-    show = Show(
-      start_time=request.form['start_time'],
-      artist_id=request.form['artist_id'],
-      venue_id=request.form['venue_id']
-    )
-    db.session.add(show)
-    db.session.commit()
-                         
+    # checked against the venue's and the artist's other shows
+    schedule_shows([{
+      'start_time': parse_datetime(request.form['start_time']),
+      'artist_id': int(request.form['artist_id']),
+      'venue_id': int(request.form['venue_id'])
+    }])
+    flash('Show was successfully listed!')
+  except ScheduleError as error:
+    flash('Show could not be listed: ' + '; '.join(problem['reason'] for problem in error.problems) + '.')
   except: 
     db.session.rollback()
     flash('An error occurred. Show could not be listed.')
@@ -548,6 +490,30 @@ def create_show_submission():
 
   return render_template('pages/home.html')
 
+@app.route('/shows/series', methods=['GET'])
+def create_show_series():
+  form = ShowSeriesForm()
+  return render_template('forms/new_show_series.html', form=form)
+
+@app.route('/shows/series', methods=['POST'])
+def create_show_series_submission():
+  # a run of shows, e.g. a weekly residency, checked against existing shows
+  # and each other and listed in one transaction, or not at all
+  form = ShowSeriesForm(request.form)
+  if not form.validate():
+    return render_template('forms/new_show_series.html', form=form), 400
+
+  shows = show_series(form.venue_id.data, form.artist_id.data, form.start_time.data, form.every_days.data, form.count.data)
+  try:
+    schedule_shows(shows)
+  except ScheduleError as error:
+    return render_template('forms/new_show_series.html', form=form, shows=shows, problems=error.problems), 409
+  finally:
+    db.session.close()
+
+  flash('{} shows were successfully listed!'.format(len(shows)))
+  return render_template('pages/home.html')
+
 # error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -572,6 +538,7 @@ if not app.debug:
 # Launch.
 #----------------------------------------------------------------------------#
 
+# Development server; in production run `gunicorn -c gunicorn.conf.py wsgi:app`
 # Default port:
 if __name__ == '__main__':
     app.run()
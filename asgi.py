@@ -0,0 +1,264 @@
+import asyncio
+import io
+import os
+from datetime import datetime
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import abort, render_template, request, url_for
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import HTTPException
+
+# serving only, no CLI setup (see LAZY_STARTUP in config.py)
+os.environ.setdefault('LAZY_STARTUP', 'true')
+
+from app import app, filter_args
+from models import Venue, Artist
+from cache import page_cache
+from catalog import (
+    catalog_filters,
+    genre_names,
+    genre_names_query,
+    venue_areas,
+    venue_areas_query,
+    venue_detail,
+    venue_detail_queries,
+    artist_detail,
+    artist_detail_queries,
+    search_ids,
+    search_rows_query,
+    search_results,
+    shows_page,
+    shows_page_query,
+    parse_cursor
+)
+
+#----------------------------------------------------------------------------#
+# ASGI entry point: uvicorn asgi:application
+#
+# The read pages (venue list, shows, venue and artist pages, search) are
+# served here with their queries on an async engine, the independent ones
+# run concurrently on separate connections, so a process keeps serving
+# other requests while one waits on the database. Every other request goes
+# to the Flask app through a WSGI adapter. Pages are rendered by the same
+# templates, go through the same page cache, and are validated by an ETag
+# of their content.
+#----------------------------------------------------------------------------#
+
+def async_url(url):
+    # the async driver for the configured database: psycopg for PostgreSQL
+    # (the same package, in its async mode), aiosqlite for SQLite
+    url = make_url(url)
+    if url.drivername.startswith('postgres'):
+        return url.set(drivername='postgresql+psycopg')
+    if url.drivername.startswith('sqlite'):
+        return url.set(drivername='sqlite+aiosqlite')
+    return url
+
+
+def wsgi_environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': (scope.get('server') or ('localhost', 80))[0],
+        'SERVER_PORT': str((scope.get('server') or ('localhost', 80))[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+class AsyncCatalog:
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        # the metered pool only works with the sync engine
+        options.pop('poolclass', None)
+        self.engine = create_async_engine(async_url(app.config['SQLALCHEMY_DATABASE_URI']), **options)
+        # endpoint: (view, whether its page is cached)
+        self.views = {
+            'venues': (self.venues, True),
+            'show_venue': (self.show_venue, True),
+            'show_artist': (self.show_artist, True),
+            'shows': (self.shows, True),
+            'search_venues': (self.search_venues, False),
+            'search_artists': (self.search_artists, False),
+        }
+
+    async def fetch(self, queries):
+        # rows of each named statement, all running at once
+        async def rows(query):
+            async with self.engine.connect() as connection:
+                return (await connection.execute(query)).all()
+        results = await asyncio.gather(*(rows(query) for query in queries.values()))
+        return dict(zip(queries, results))
+
+    #  Views
+    #  ----------------------------------------------------------------
+
+    async def venues(self):
+        filters = filter_args()
+        results = await self.fetch({
+            'venues': venue_areas_query(*catalog_filters(Venue, **filters)),
+            'genres': genre_names_query()
+        })
+        data, next_show = venue_areas(rows=results['venues'])
+        page_cache.expire_at(next_show)
+        return render_template('pages/venues.html', areas=data, genres=genre_names(results['genres']), filters=filters)
+
+    async def detail(self, queries, detail, id):
+        # a venue or artist page; the row, its genres and its shows are all
+        # fetched together
+        past_page = max(request.args.get('past_page', 1, type=int), 1)
+        now = datetime.now()
+        data = detail(id, past_page, now, await self.fetch(queries(id, past_page, now)))
+        if data is None:
+            abort(404)
+
+        # the page changes when the next upcoming show starts
+        if data['upcoming_shows']:
+            page_cache.expire_at(data['upcoming_shows'][0]['start_time'])
+        return data
+
+    async def show_venue(self, venue_id):
+        data = await self.detail(venue_detail_queries, venue_detail, venue_id)
+        return render_template('pages/show_venue.html', venue=data)
+
+    async def show_artist(self, artist_id):
+        data = await self.detail(artist_detail_queries, artist_detail, artist_id)
+        return render_template('pages/show_artist.html', artist=data)
+
+    async def shows(self):
+        after = request.args.get('after')
+        after_id = request.args.get('after_id', type=int)
+        if after is not None:
+            after = parse_cursor(after)
+            if after is None:
+                abort(400)
+
+        results = await self.fetch({'shows': shows_page_query(after, after_id)})
+        data, cursor = shows_page(after, after_id, rows=results['shows'])
+
+        next_page = None
+        if cursor:
+            next_page = url_for('shows', after=cursor[0].isoformat(), after_id=cursor[1])
+        return render_template('pages/shows.html', shows=data, next_page=next_page)
+
+    async def search(self, model, template):
+        # the match runs on the sync search backend in a thread (the in-process
+        # index or pg_trgm), then the matching rows on the async engine
+        search_term = request.form.get('search_term', '')
+        page = max(request.form.get('page', 1, type=int), 1)
+        genre = request.form.get('genre') or None
+        found = await asyncio.to_thread(search_ids, model, search_term, page, genre)
+        rows = (await self.fetch({'rows': search_rows_query(model, found[0])}))['rows']
+        response = search_results(model, search_term, page, genre, found, rows)
+        return render_template(template, results=response, search_term=search_term, genre=genre)
+
+    async def search_venues(self):
+        return await self.search(Venue, 'pages/search_venues.html')
+
+    async def search_artists(self):
+        return await self.search(Artist, 'pages/search_artists.html')
+
+    #  ASGI
+    #  ----------------------------------------------------------------
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        endpoint = None
+        if scope['type'] == 'http':
+            try:
+                endpoint = self.app.url_map.bind('localhost').match(scope['path'], scope['method'])[0]
+            except HTTPException:
+                pass
+        if endpoint not in self.views:
+            return await self.wsgi(scope, receive, send)
+
+        body = await read_body(receive)
+        environ = wsgi_environ(scope, body)
+        response = await self.respond(endpoint, environ)
+        if response is None:
+            # the body has been read already; hand it on as it was
+            async def replay():
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await self.wsgi(scope, replay, send)
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+        })
+        # no body for HEAD and 304 responses
+        await send({'type': 'http.response.body', 'body': b''.join(response.get_app_iter(environ))})
+
+    async def respond(self, endpoint, environ):
+        # the view's response after the app's request hooks, or None to
+        # leave the request to the Flask app
+        view, cached = self.views[endpoint]
+        with self.app.request_context(environ):
+            key = page_cache.key(request.view_args) if cached else None
+            if cached and key is None:
+                return None
+            try:
+                try:
+                    page = self.app.preprocess_request()
+                    if page is None:
+                        page = page_cache.backend.get(key) if key else None
+                    if page is None:
+                        page = await view(**request.view_args)
+                        if key:
+                            page_cache.store(key, page)
+                except Exception as error:
+                    page = self.app.handle_user_exception(error)
+                response = self.app.finalize_request(page)
+            except Exception as error:
+                response = self.app.handle_exception(error)
+
+            if cached and response.status_code == 200:
+                # let clients and proxies store the page, but revalidate each time
+                response.add_etag()
+                response.cache_control.no_cache = True
+                response.make_conditional(request)
+            return response
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = AsyncCatalog(app)
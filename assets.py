@@ -0,0 +1,346 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import time
+
+import click
+from flask import Blueprint, current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Static asset pipeline. `flask assets build` bundles and minifies the CSS
+# and JS, writes resized JPEG/WebP variants of the images in static/img,
+# names every output after a hash of its content and pre-compresses it with
+# gzip (and brotli, if installed). The outputs and a manifest mapping the
+# source names to them go to static/dist, served from /assets with a
+# far-future Cache-Control. Before a build, or for files the build doesn't
+# produce, the helpers fall back to the plain /static files.
+#
+# A build leaves the outputs of earlier builds in place, since pages and
+# caches rendered before it still link to them; `flask assets prune` deletes
+# the ones the current manifest no longer names once they are old enough.
+#
+# The build also compiles every template into a Jinja bytecode cache, which
+# the app loads from at startup instead of compiling on first render.
+#----------------------------------------------------------------------------#
+
+# bundles, in load order
+BUNDLES = {
+    'css/bundle.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # loaded in <head>, before the page renders
+    'js/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # deferred, after jQuery
+    'js/app.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+# widths of the image variants; images narrower than a width skip it
+IMAGE_WIDTHS = (480, 960, 1600)
+IMAGE_QUALITY = 80
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json')
+
+assets = Blueprint('assets', __name__)
+assets_cli = AppGroup('assets', help='Build the static asset bundles.')
+
+#----------------------------------------------------------------------------#
+# Build.
+#----------------------------------------------------------------------------#
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    # rjsmin when installed; the libraries are minified already, so the
+    # fallback only drops blank lines
+    try:
+        import rjsmin
+    except ImportError:
+        return '\n'.join(line for line in js.splitlines() if line.strip())
+    return rjsmin.jsmin(js)
+
+
+def absolute_urls(css, source):
+    # url(...) in a stylesheet is relative to its file, which moves when it
+    # is bundled; point relative urls at /static instead
+    base = posixpath.dirname('/static/' + source)
+
+    def rewrite(match):
+        url = match.group(2)
+        if re.match(r'^(/|[a-z]+:|#)', url):
+            return match.group(0)
+        return 'url({0}{1}{0})'.format(match.group(1), posixpath.normpath(posixpath.join(base, url)))
+    return re.sub(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)', rewrite, css)
+
+
+def bundle(static, name, sources):
+    parts = []
+    for source in sources:
+        with open(os.path.join(static, source), encoding='utf-8') as file:
+            text = file.read()
+        parts.append(absolute_urls(text, source) if name.endswith('.css') else text)
+    if name.endswith('.css'):
+        return minify_css('\n'.join(parts)).encode()
+    # a ; between files keeps one file's last statement from running into
+    # the next
+    return ';\n'.join(minify_js(part) for part in parts).encode()
+
+
+def write_output(dist, name, data):
+    # write data under a content-hashed name with compressed variants;
+    # returns the hashed name
+    root, extension = posixpath.splitext(name)
+    hashed = '{}.{}{}'.format(root, hashlib.md5(data).hexdigest()[:10], extension)
+    path = os.path.join(dist, hashed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(data)
+
+    if extension in COMPRESSIBLE:
+        with open(path + '.gz', 'wb') as file:
+            file.write(gzip.compress(data, compresslevel=9, mtime=0))
+        try:
+            import brotli
+        except ImportError:
+            pass
+        else:
+            with open(path + '.br', 'wb') as file:
+                file.write(brotli.compress(data, quality=11))
+    return hashed
+
+
+def image_variants(static, name):
+    # (variant name, bytes, width) for each width and format of an image;
+    # Pillow is optional, without it images are served as they are
+    try:
+        from PIL import Image
+    except ImportError:
+        click.echo('Pillow is not installed, skipping ' + name, err=True)
+        return []
+
+    variants = []
+    with Image.open(os.path.join(static, name)) as image:
+        image = image.convert('RGB')
+        root = posixpath.splitext(name)[0]
+        for width in IMAGE_WIDTHS:
+            if width > image.width and width != IMAGE_WIDTHS[0]:
+                continue
+            # never upscale; the smallest variant is the image itself
+            resized = image
+            if image.width > width:
+                resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            for format, extension in (('JPEG', '.jpg'), ('WEBP', '.webp')):
+                output = _encode_image(resized, format)
+                variants.append(('{}-{}w{}'.format(root, resized.width, extension), output, resized.width))
+    return variants
+
+
+def _encode_image(image, format):
+    buffer = io.BytesIO()
+    options = {'quality': IMAGE_QUALITY}
+    if format == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    else:
+        options.update(method=6)
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+class TemplateCache(FileSystemBytecodeCache):
+    # entries that can't be written, e.g. on a read-only filesystem, are
+    # compiled in memory as without the cache
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+def compile_templates(app):
+    # compile every template now rather than on its first render
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+
+def build_template_cache(app):
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    cache = app.jinja_env.bytecode_cache = TemplateCache(directory)
+    cache.clear()
+    app.jinja_env.cache.clear()
+    compile_templates(app)
+    click.echo('templates -> {} ({} files)'.format(directory, len(os.listdir(directory))))
+
+
+def build(app):
+    static = app.static_folder
+    dist = app.config['ASSETS_DIST']
+    manifest = {'files': {}, 'images': {}}
+
+    for name, sources in BUNDLES.items():
+        data = bundle(static, name, sources)
+        manifest['files'][name] = write_output(dist, name, data)
+        click.echo('{} -> {} ({} bytes)'.format(name, manifest['files'][name], len(data)))
+
+    image_dir = os.path.join(static, 'img')
+    for filename in sorted(os.listdir(image_dir)) if os.path.isdir(image_dir) else []:
+        if not filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            continue
+        name = 'img/' + filename
+        variants = manifest['images'][name] = []
+        for variant, data, width in image_variants(static, name):
+            hashed = write_output(dist, variant, data)
+            variants.append({'path': hashed, 'width': width, 'type': 'image/' + posixpath.splitext(variant)[1][1:].replace('jpg', 'jpeg')})
+            click.echo('{} -> {} ({} bytes)'.format(name, hashed, len(data)))
+
+    # replaced in one step, so a worker never reads a half-written manifest
+    path = os.path.join(dist, 'manifest.json')
+    with open(path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+    build_template_cache(app)
+    return manifest
+
+
+def prune(app, days):
+    # delete the outputs of earlier builds that the current manifest doesn't
+    # name and that weren't written in the last `days` days; returns their
+    # names
+    dist = app.config['ASSETS_DIST']
+    with open(os.path.join(dist, 'manifest.json')) as file:
+        data = json.load(file)
+    current = set(data['files'].values())
+    current.update(variant['path'] for variants in data['images'].values() for variant in variants)
+    cutoff = time.time() - days * 24 * 60 * 60
+
+    removed = []
+    for directory, dirnames, filenames in os.walk(dist):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = posixpath.relpath(path.replace(os.sep, '/'), dist.replace(os.sep, '/'))
+            root, extension = posixpath.splitext(name)
+            # compressed copies go with the file they compress
+            output = root if extension in ('.gz', '.br') else name
+            if output == 'manifest.json' or output in current or os.path.getmtime(path) > cutoff:
+                continue
+            os.remove(path)
+            removed.append(name)
+    return removed
+
+
+@assets_cli.command('build')
+def build_command():
+    """Bundle, fingerprint and compress the static assets, and compile the templates."""
+    build(current_app)
+
+
+@assets_cli.command('prune')
+@click.option('--days', type=int, help='Keep outputs written this recently.  [default: ASSETS_PRUNE_DAYS]')
+def prune_command(days):
+    """Delete the outputs of earlier builds that the current one no longer uses."""
+    if not os.path.isfile(os.path.join(current_app.config['ASSETS_DIST'], 'manifest.json')):
+        raise click.ClickException('nothing to prune, run `flask assets build` first')
+    days = current_app.config['ASSETS_PRUNE_DAYS'] if days is None else days
+    removed = prune(current_app, days)
+    for name in removed:
+        click.echo('removed ' + name)
+    click.echo('{} files removed'.format(len(removed)))
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_manifest = {'mtime': None, 'files': {}, 'images': {}}
+
+
+def manifest():
+    # the build's manifest, reread when a new build replaces it
+    path = os.path.join(current_app.config['ASSETS_DIST'], 'manifest.json')
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    if mtime != _manifest['mtime']:
+        data = {'files': {}, 'images': {}}
+        if mtime is not None:
+            with open(path) as file:
+                data = json.load(file)
+        _manifest.update(data, mtime=mtime)
+    return _manifest
+
+
+def asset_url(name):
+    # url of a file under static/, fingerprinted when it has been built
+    hashed = manifest()['files'].get(name)
+    if hashed is None:
+        return url_for('static', filename=name)
+    return url_for('assets.asset', filename=hashed)
+
+
+def bundle_urls(name):
+    # the bundle when it has been built, otherwise its source files
+    if name in manifest()['files']:
+        return [asset_url(name)]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+
+def image_srcset(name, type='image/jpeg'):
+    # srcset of an image's built variants of one type, '' before a build
+    return ', '.join(
+        '{} {}w'.format(url_for('assets.asset', filename=variant['path']), variant['width'])
+        for variant in manifest()['images'].get(name, []) if variant['type'] == type
+    )
+
+
+@assets.route('/<path:filename>')
+def asset(filename):
+    # hashed files never change, so they may be cached for good; compressed
+    # variants are picked by Accept-Encoding
+    dist = current_app.config['ASSETS_DIST']
+    max_age = current_app.config['ASSETS_MAX_AGE']
+    for encoding, suffix in ENCODINGS:
+        if encoding in request.accept_encodings and os.path.isfile(os.path.join(dist, filename + suffix)):
+            response = send_from_directory(dist, filename + suffix, max_age=max_age)
+            response.headers['Content-Encoding'] = encoding
+            response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            break
+    else:
+        response = send_from_directory(dist, filename, max_age=max_age)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def setup_assets(app):
+    if os.path.isdir(app.config['TEMPLATE_CACHE_DIR']):
+        app.jinja_env.bytecode_cache = TemplateCache(app.config['TEMPLATE_CACHE_DIR'])
+    app.register_blueprint(assets, url_prefix='/assets')
+    app.cli.add_command(assets_cli)
+    app.jinja_env.globals.update(asset_url=asset_url, bundle_urls=bundle_urls, image_srcset=image_srcset)
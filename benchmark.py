@@ -0,0 +1,307 @@
+#----------------------------------------------------------------------------#
+# Benchmark: seeds a throwaway database with a synthetic catalog, drives the
+# routes through the Flask test client and reports latency percentiles,
+# queries per request and peak memory per route as JSON.
+#
+#   python benchmark.py --venues 1000 --artists 3000 --shows 100000 -o after.json
+#   python benchmark.py --compare before.json after.json
+#
+# The database defaults to a SQLite file in the temp directory; pass
+# --database-url postgresql://... to benchmark against a throwaway
+# PostgreSQL database. Its tables are dropped and recreated.
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+    'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+    'Rock n Roll', 'Soul', 'Swing', 'Other'
+]
+CITIES = [
+    ('San Francisco', 'CA'), ('Oakland', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'),
+    ('Brooklyn', 'NY'), ('Chicago', 'IL'), ('Austin', 'TX'), ('Seattle', 'WA'),
+    ('Portland', 'OR'), ('Nashville', 'TN'), ('New Orleans', 'LA'), ('Denver', 'CO')
+]
+WORDS = [
+    'Blue', 'Red', 'Golden', 'Velvet', 'Electric', 'Midnight', 'Wild', 'Silver', 'Broken',
+    'Lucky', 'Hollow', 'Neon', 'Lonely', 'Little', 'Royal', 'Crooked', 'Paper', 'Iron'
+]
+VENUE_KINDS = ['Hall', 'Club', 'Lounge', 'Room', 'Theatre', 'Tavern', 'Garden', 'Bar']
+ARTIST_KINDS = ['Band', 'Trio', 'Quartet', 'Orchestra', 'Collective', 'Sisters', 'Brothers', 'Project']
+
+#----------------------------------------------------------------------------#
+# Synthetic catalog.
+#----------------------------------------------------------------------------#
+
+def name(rng, kinds, number):
+    return '{} {} {} {}'.format(rng.choice(WORDS), rng.choice(WORDS), rng.choice(kinds), number)
+
+
+def venue_rows(rng, count):
+    for id in range(1, count + 1):
+        city, state = rng.choice(CITIES)
+        yield {
+            'id': id,
+            'name': name(rng, VENUE_KINDS, id),
+            'city': city,
+            'state': state,
+            'address': '{} Main Street'.format(rng.randint(1, 9999)),
+            'phone': '{:03}-{:03}-{:04}'.format(rng.randint(200, 999), rng.randint(0, 999), rng.randint(0, 9999)),
+            'genres': rng.sample(GENRES, rng.randint(1, 4)),
+            'seeking_talent': rng.random() < 0.3,
+            'image_link': 'https://example.com/venues/{}.jpg'.format(id)
+        }
+
+
+def artist_rows(rng, count):
+    for id in range(1, count + 1):
+        city, state = rng.choice(CITIES)
+        yield {
+            'id': id,
+            'name': name(rng, ARTIST_KINDS, id),
+            'city': city,
+            'state': state,
+            'phone': '{:03}-{:03}-{:04}'.format(rng.randint(200, 999), rng.randint(0, 999), rng.randint(0, 9999)),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'seeking_venue': rng.random() < 0.3,
+            'image_link': 'https://example.com/artists/{}.jpg'.format(id)
+        }
+
+
+def show_rows(rng, count, venues, artists, now):
+    # start times spread over a year either side of now
+    for id in range(1, count + 1):
+        yield {
+            'id': id,
+            'venue_id': rng.randint(1, venues),
+            'artist_id': rng.randint(1, artists),
+            'start_time': (now + timedelta(minutes=rng.randint(-525600, 525600))).isoformat()
+        }
+
+
+def seed(app, venues, artists, shows, batch_size, random_seed):
+    from models import db
+    from commands import load_rows, invalidate_caches
+    from counters import reconcile
+
+    rng = random.Random(random_seed)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        load_rows('venues', venue_rows(rng, venues), batch_size)
+        load_rows('artists', artist_rows(rng, artists), batch_size)
+        load_rows('shows', show_rows(rng, shows, venues, artists, datetime.now()), batch_size)
+        reconcile()
+        invalidate_caches()
+        return time.perf_counter() - started
+
+#----------------------------------------------------------------------------#
+# Routes.
+#----------------------------------------------------------------------------#
+
+def routes(rng, venues, artists, writes):
+    # (name, method, url, form data) per route; ids are drawn at random on
+    # every request so the page cache doesn't see only one page
+    venue = lambda: rng.randint(1, venues)
+    artist = lambda: rng.randint(1, artists)
+    term = lambda: rng.choice(WORDS).lower()[:3]
+    genre = lambda: rng.choice(GENRES)
+
+    read = [
+        ('index', 'GET', lambda: '/', None),
+        ('venues', 'GET', lambda: '/venues', None),
+        ('venues?genre', 'GET', lambda: '/venues?genre=' + genre(), None),
+        ('search_venues', 'POST', lambda: '/venues/search', lambda: {'search_term': term()}),
+        ('show_venue', 'GET', lambda: '/venues/{}'.format(venue()), None),
+        ('artists', 'GET', lambda: '/artists', None),
+        ('artists?genre', 'GET', lambda: '/artists?genre=' + genre(), None),
+        ('search_artists', 'POST', lambda: '/artists/search', lambda: {'search_term': term()}),
+        ('show_artist', 'GET', lambda: '/artists/{}'.format(artist()), None),
+        ('shows', 'GET', lambda: '/shows', None),
+        ('create_venue_form', 'GET', lambda: '/venues/create', None),
+        ('create_artist_form', 'GET', lambda: '/artists/create', None),
+        ('create_shows', 'GET', lambda: '/shows/create', None),
+        ('edit_venue', 'GET', lambda: '/venues/{}/edit'.format(venue()), None),
+        ('edit_artist', 'GET', lambda: '/artists/{}/edit'.format(artist()), None),
+        ('api.venues', 'GET', lambda: '/api/v1/venues?limit=100', None),
+        ('api.artists', 'GET', lambda: '/api/v1/artists?limit=100', None),
+        ('api.shows', 'GET', lambda: '/api/v1/shows?limit=100', None),
+        ('api.show_venue', 'GET', lambda: '/api/v1/venues/{}'.format(venue()), None),
+        ('api.search_artists', 'GET', lambda: '/api/v1/artists/search?search_term=' + term(), None),
+    ]
+    if not writes:
+        return read
+
+    def venue_form():
+        city, state = rng.choice(CITIES)
+        return {
+            'name': name(rng, VENUE_KINDS, rng.randint(1, 10 ** 6)), 'city': city, 'state': state,
+            'address': '1 Main Street', 'phone': '', 'genres': rng.sample(GENRES, 2),
+            'facebook_link': '', 'image_link': '', 'website': ''
+        }
+
+    def artist_form():
+        city, state = rng.choice(CITIES)
+        return {
+            'name': name(rng, ARTIST_KINDS, rng.randint(1, 10 ** 6)), 'city': city, 'state': state,
+            'phone': '', 'genres': rng.sample(GENRES, 2), 'facebook_link': '', 'image_link': '', 'website': ''
+        }
+
+    return read + [
+        ('create_venue_submission', 'POST', lambda: '/venues/create', venue_form),
+        ('create_artist_submission', 'POST', lambda: '/artists/create', artist_form),
+        ('create_show_submission', 'POST', lambda: '/shows/create', lambda: {
+            'venue_id': venue(), 'artist_id': artist(),
+            'start_time': (datetime.now() + timedelta(days=rng.randint(1, 365))).strftime('%Y-%m-%d %H:%M:%S')
+        }),
+        ('edit_venue_submission', 'POST', lambda: '/venues/{}/edit'.format(venue()), venue_form),
+        ('edit_artist_submission', 'POST', lambda: '/artists/{}/edit'.format(artist()), artist_form),
+    ]
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(int(round(percent / 100 * (len(values) - 1))), len(values) - 1)]
+
+
+def run_route(client, method, url, data, requests, warmup):
+    from instrumentation import QueryStats, recorders
+
+    for _ in range(warmup):
+        client.open(url(), method=method, data=data() if data else None)
+
+    latencies = []
+    queries = []
+    statuses = set()
+    for _ in range(requests):
+        stats = QueryStats(slowest=0)
+        recorders().append(stats)
+        started = time.perf_counter()
+        try:
+            response = client.open(url(), method=method, data=data() if data else None)
+            response.get_data()
+        finally:
+            latencies.append(time.perf_counter() - started)
+            recorders().remove(stats)
+        queries.append(stats.count)
+        statuses.add(response.status_code)
+
+    # memory is measured on a separate request, tracing slows everything
+    tracemalloc.start()
+    client.open(url(), method=method, data=data() if data else None).get_data()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'requests': requests,
+        'status': sorted(statuses),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'queries_mean': round(statistics.mean(queries), 2),
+        'queries_max': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+#----------------------------------------------------------------------------#
+# Reports.
+#----------------------------------------------------------------------------#
+
+def print_table(results, out=sys.stderr):
+    print('{:<28} {:>9} {:>9} {:>8} {:>10}'.format('route', 'p50 ms', 'p95 ms', 'queries', 'peak KB'), file=out)
+    for route, result in results['routes'].items():
+        print('{:<28} {:>9.2f} {:>9.2f} {:>8.1f} {:>10.1f}'.format(
+            route, result['p50_ms'], result['p95_ms'], result['queries_mean'], result['peak_memory_kb']
+        ), file=out)
+
+
+def compare(before, after, out=sys.stdout):
+    # per-route change of p50, p95 and queries between two JSON reports
+    print('{:<28} {:>16} {:>16} {:>12}'.format('route', 'p50 ms', 'p95 ms', 'queries'), file=out)
+    for route, new in after['routes'].items():
+        old = before['routes'].get(route)
+        if old is None:
+            continue
+        change = lambda key: '{:.2f} ({:+.0%})'.format(new[key], (new[key] - old[key]) / old[key] if old[key] else 0)
+        print('{:<28} {:>16} {:>16} {:>12}'.format(
+            route, change('p50_ms'), change('p95_ms'), '{} -> {}'.format(old['queries_mean'], new['queries_mean'])
+        ), file=out)
+
+#----------------------------------------------------------------------------#
+# Main.
+#----------------------------------------------------------------------------#
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Fyyur routes on a synthetic catalog.')
+    parser.add_argument('--venues', type=int, default=500)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed requests per route')
+    parser.add_argument('--seed', type=int, default=1, help='random seed of the catalog and the request mix')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--database-url', default='sqlite:///' + os.path.join(tempfile.gettempdir(), 'fyyur-benchmark.db'))
+    parser.add_argument('--no-page-cache', action='store_true', help='render every page instead of serving cached pages')
+    parser.add_argument('--writes', action='store_true', help='also benchmark the create and edit submissions')
+    parser.add_argument('--route', action='append', help='only these routes (repeatable)')
+    parser.add_argument('--output', '-o', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two JSON reports and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            compare(json.load(before), json.load(after))
+        return
+
+    # the app reads its configuration when it is imported
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SERVER_TIMING', 'false')
+    from app import app
+    app.config.update(WTF_CSRF_ENABLED=False, SLOW_REQUEST_MS=10 ** 9, SLOW_REQUEST_DB_MS=10 ** 9, SLOW_REQUEST_QUERIES=10 ** 9)
+    if args.no_page_cache:
+        app.config['PAGE_CACHE_BACKEND'] = None
+        from cache import page_cache
+        page_cache.backend = None
+
+    print('seeding {} venues, {} artists, {} shows'.format(args.venues, args.artists, args.shows), file=sys.stderr)
+    seed_time = seed(app, args.venues, args.artists, args.shows, args.batch_size, args.seed)
+
+    rng = random.Random(args.seed)
+    client = app.test_client()
+    results = {}
+    for route, method, url, data in routes(rng, args.venues, args.artists, args.writes):
+        if args.route and route not in args.route:
+            continue
+        results[route] = run_route(client, method, url, data, args.requests, args.warmup)
+
+    report = {
+        'created': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'database': args.database_url.split(':', 1)[0],
+        'catalog': {'venues': args.venues, 'artists': args.artists, 'shows': args.shows, 'seed': args.seed},
+        'seed_seconds': round(seed_time, 2),
+        'page_cache': not args.no_page_cache,
+        'routes': results
+    }
+    print_table(report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, request, session, make_response
+from sqlalchemy import event
+
+from models import db, Venue, Artist, Show, Genre
+
+#----------------------------------------------------------------------------#
+# Cache backends.
+#----------------------------------------------------------------------------#
+
+class LRUCache:
+    # in-process cache, bounded by number of entries
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class RedisCache:
+    # shared cache for several workers; any client with the redis-py
+    # get/set/delete/scan_iter interface can stand in for a real server
+
+    def __init__(self, client, namespace='fyyur:page:'):
+        self.client = client
+        self.namespace = namespace
+
+    def get(self, key):
+        return self.client.get(self.namespace + key)
+
+    def set(self, key, value, expires_at=None):
+        timeout = None
+        if expires_at is not None:
+            timeout = max(int(expires_at - time.time()), 1)
+        self.client.set(self.namespace + key, value, ex=timeout)
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.namespace + prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        self.delete_prefix('')
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+class PageCache:
+    # caches rendered read pages per route and entity id; entries are
+    # dropped when a venue, artist or show they depend on is committed
+
+    def __init__(self):
+        self.backend = None
+        self.timeout = None
+
+    def init_app(self, app):
+        if app.config['PAGE_CACHE_BACKEND'] == 'redis':
+            import redis
+            client = redis.Redis.from_url(app.config['PAGE_CACHE_REDIS_URL'])
+            self.backend = RedisCache(client)
+        else:
+            self.backend = LRUCache(app.config['PAGE_CACHE_SIZE'])
+        self.timeout = app.config['PAGE_CACHE_TIMEOUT']
+
+    def key(self, kwargs):
+        # '<endpoint>:<entity id>:<path and query string>' of the current
+        # request, or None if its page mustn't be cached: pending flash
+        # messages are rendered into the page, so skip the cache until they
+        # have been shown
+        if self.backend is None or session.get('_flashes'):
+            return None
+        entity_id = next(iter(kwargs.values()), '')
+        return '{}:{}:{}'.format(request.endpoint, entity_id, request.full_path)
+
+    def store(self, key, page):
+        if isinstance(page, (str, bytes)):
+            self.backend.set(key, page, self.expires_at())
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            key = self.key(kwargs)
+            if key is None:
+                return view(**kwargs)
+
+            page = self.backend.get(key)
+            if page is not None:
+                return page
+
+            page = view(**kwargs)
+            self.store(key, page)
+            return page
+        return wrapper
+
+    def expire_at(self, moment):
+        # called by views whose page changes at a given time, such as the
+        # next upcoming show turning into a past show
+        if moment is not None:
+            moment = moment.timestamp()
+            g.page_expires_at = min(g.get('page_expires_at', moment), moment)
+
+    def expires_at(self):
+        expires_at = g.pop('page_expires_at', None)
+        if self.timeout:
+            timeout = time.time() + self.timeout
+            expires_at = timeout if expires_at is None else min(expires_at, timeout)
+        return expires_at
+
+    def invalidate(self, prefixes):
+        if self.backend is not None:
+            for prefix in prefixes:
+                self.backend.delete_prefix(prefix)
+
+
+page_cache = PageCache()
+
+
+def setup_cache(app):
+    page_cache.init_app(app)
+    return page_cache
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+def conditional(view):
+    # the ETag is a hash of the page itself, which comes from the page cache
+    # when it is there, so revalidating a cached page queries nothing. There
+    # is no Last-Modified: no single modification time changes when rows are
+    # deleted or an upcoming show starts, the content does.
+    @wraps(view)
+    def wrapper(**kwargs):
+        response = make_response(view(**kwargs))
+        if response.status_code == 200:
+            response.add_etag()
+            # let clients and proxies store the page, but revalidate each time
+            response.cache_control.no_cache = True
+            response.make_conditional(request)
+        return response
+    return wrapper
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+# pages that show data of every row of a model
+MODEL_PAGES = {
+    Venue: ('venues:', 'shows:', 'show_venue:', 'show_artist:'),
+    Artist: ('artists:', 'shows:', 'show_venue:', 'show_artist:'),
+    Show: ('venues:', 'shows:', 'show_venue:', 'show_artist:'),
+    # the genre filters of the listings
+    Genre: ('venues:', 'artists:'),
+}
+
+
+def changed_pages(obj):
+    if isinstance(obj, Venue):
+        return {'venues:', 'shows:', 'show_artist:', 'show_venue:{}:'.format(obj.id)}
+    if isinstance(obj, Artist):
+        return {'artists:', 'shows:', 'show_venue:', 'show_artist:{}:'.format(obj.id)}
+    if isinstance(obj, Show):
+        # include the previous venue/artist when a show is moved
+        state = db.inspect(obj)
+        venue_ids = {obj.venue_id, *state.attrs.venue_id.history.deleted}
+        artist_ids = {obj.artist_id, *state.attrs.artist_id.history.deleted}
+        return {'venues:', 'shows:'} \
+            | {'show_venue:{}:'.format(id) for id in venue_ids} \
+            | {'show_artist:{}:'.format(id) for id in artist_ids}
+    if isinstance(obj, Genre):
+        return set(MODEL_PAGES[Genre])
+    return set()
+
+
+@event.listens_for(db.session, 'before_flush')
+def collect_changes(session, flush_context, instances):
+    pages = session.info.setdefault('page_cache_changes', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        pages |= changed_pages(obj)
+
+
+@event.listens_for(db.session, 'after_bulk_delete')
+@event.listens_for(db.session, 'after_bulk_update')
+def collect_bulk_changes(context):
+    pages = context.session.info.setdefault('page_cache_changes', set())
+    pages |= set(MODEL_PAGES.get(context.mapper.class_, ()))
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_changes(session):
+    page_cache.invalidate(session.info.pop('page_cache_changes', ()))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changes(session):
+    session.info.pop('page_cache_changes', None)
@@ -0,0 +1,347 @@
+from datetime import datetime
+
+from flask import current_app
+
+from models import db, Venue, Artist, Show, Genre, venue_genres, artist_genres, name_initial
+from search import get_search_backend
+
+#----------------------------------------------------------------------------#
+# Page data shared by the HTML views and the JSON API. Times are returned
+# as datetime objects; each side formats them for its output.
+#
+# Pages built from several independent queries are split in two: *_queries()
+# returns the statements by name, and the data function builds the page
+# from their rows. Here run_queries() runs them one after another; asgi.py
+# runs the same statements concurrently on an async engine.
+#----------------------------------------------------------------------------#
+
+def run_queries(queries):
+    return {name: db.session.execute(query).all() for name, query in queries.items()}
+
+
+def catalog_filters(model, genre=None, city=None, state=None):
+    # exact-match filters for listings; genre is looked up through the
+    # genre_id index of the association table
+    filters = []
+    if genre:
+        filters.append(model.genres.any(Genre.name == genre))
+    if city:
+        filters.append(model.city == city)
+    if state:
+        filters.append(model.state == state)
+    return filters
+
+
+def genre_names_query():
+    return db.select(Genre.name).order_by(Genre.name)
+
+
+def genre_names(rows=None):
+    if rows is None:
+        rows = db.session.execute(genre_names_query())
+    return [name for name, in rows]
+
+#  Venues
+#  ----------------------------------------------------------------
+
+def venue_list(*filters):
+    # venues with their upcoming show count and next show, kept on the
+    # venue row by counters.py
+    return db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.upcoming_shows_count.label('num_upcoming_shows'),
+        Venue.next_show_at.label('next_show')
+    ).filter(*filters)
+
+
+def venue_row(venue):
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "city": venue.city,
+        "state": venue.state,
+        "num_upcoming_shows": venue.num_upcoming_shows
+    }
+
+
+def venue_areas_query(*filters):
+    return venue_list(*filters).order_by(Venue.city, Venue.state, Venue.name).statement
+
+
+def venue_areas(*filters, rows=None):
+    # venues grouped by city and state; also returns when the next
+    # upcoming show starts, since the counts change then
+    venues = rows
+    if venues is None:
+        venues = db.session.execute(venue_areas_query(*filters)).all()
+
+    data = []
+    areas = {}
+    for venue in venues:
+        area = areas.get((venue.city, venue.state))
+        if area is None:
+            area = {
+                "city": venue.city,
+                "state": venue.state,
+                "venues": []
+            }
+            areas[(venue.city, venue.state)] = area
+            data.append(area)
+
+        area["venues"].append({
+            "id": venue.id,
+            "name": venue.name,
+            "num_upcoming_shows": venue.num_upcoming_shows
+        })
+
+    next_show = min((venue.next_show for venue in venues if venue.next_show), default=None)
+    return data, next_show
+
+
+def detail_queries(model, genres, shows, id, past_page, now):
+    # statements for a venue or artist page: the row, its genres, its
+    # upcoming shows, one page of past shows and the number of past shows.
+    # A show starting exactly now is past, as in the upcoming show counters.
+    per_page = current_app.config['PAST_SHOWS_PER_PAGE']
+    key = next(column for column in genres.columns if column.name != 'genre_id')
+    show_key = getattr(Show, key.name)
+
+    return {
+        "row": db.select(*model.__table__.columns).where(model.id == id),
+        "genres": db.select(Genre.name).join(genres, genres.c.genre_id == Genre.id).where(
+            key == id
+        ).order_by(Genre.name),
+        "upcoming": shows.where(show_key == id, Show.start_time > now).order_by(Show.start_time),
+        "past": shows.where(show_key == id, Show.start_time <= now).order_by(
+            Show.start_time.desc()
+        ).limit(per_page).offset((past_page - 1) * per_page),
+        "past_shows_count": db.select(db.func.count(Show.id)).where(show_key == id, Show.start_time <= now)
+    }
+
+
+def venue_detail_queries(venue_id, past_page, now):
+    shows = db.select(
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time
+    ).join(Show, Show.artist_id == Artist.id)
+    return detail_queries(Venue, venue_genres, shows, venue_id, past_page, now)
+
+
+def venue_detail(venue_id, past_page, now, results=None):
+    # venue with its upcoming shows and one page of past shows, or None
+    if results is None:
+        results = run_queries(venue_detail_queries(venue_id, past_page, now))
+    if not results['row']:
+        return None
+
+    venue = results['row'][0]
+    upcoming = results['upcoming']
+    past = results['past']
+    past_shows_count = results['past_shows_count'][0][0]
+    per_page = current_app.config['PAST_SHOWS_PER_PAGE']
+
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": genre_names(results['genres']),
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "facebook_link": venue.facebook_link,
+        "image_link": venue.image_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "website": venue.website,
+        "past_shows": [show._asdict() for show in past],
+        "upcoming_shows": [show._asdict() for show in upcoming],
+        "past_shows_count": past_shows_count,
+        "upcoming_shows_count": len(upcoming),
+        "past_page": past_page,
+        "more_past_shows": past_page * per_page < past_shows_count
+    }
+
+#  Artists
+#  ----------------------------------------------------------------
+
+# first letters of the artist directory; '#' is every other name
+LETTERS = [chr(code) for code in range(ord('A'), ord('Z') + 1)] + ['#']
+
+
+def artist_list(*filters):
+    return db.session.query(Artist.id, Artist.name).filter(*filters)
+
+
+def letter_filter(column, letter):
+    # names under a directory letter, by their upper-cased initial; only
+    # equality, since ranges of names depend on case and the collation
+    if letter == '#':
+        return name_initial(column).notin_(LETTERS[:-1])
+    return name_initial(column) == letter
+
+
+def artists_page(filters, letter=None, after=None, after_id=None):
+    # one page of artists (id and name only) in name order, and the
+    # (name, id) cursor of the next page
+    per_page = current_app.config['ARTISTS_PER_PAGE']
+    artists = artist_list(*filters)
+    if letter:
+        artists = artists.filter(letter_filter(Artist.name, letter))
+    if after is not None and after_id is not None:
+        artists = artists.filter(db.tuple_(Artist.name, Artist.id) > (after, after_id))
+    artists = artists.order_by(Artist.name, Artist.id).limit(per_page + 1).all()
+
+    cursor = None
+    if len(artists) > per_page:
+        last = artists[per_page - 1]
+        cursor = (last.name, last.id)
+    return artists[:per_page], cursor
+
+
+def artist_detail_queries(artist_id, past_page, now):
+    shows = db.select(
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+        Show.start_time
+    ).join(Show, Show.venue_id == Venue.id)
+    return detail_queries(Artist, artist_genres, shows, artist_id, past_page, now)
+
+
+def artist_detail(artist_id, past_page, now, results=None):
+    # artist with upcoming shows and one page of past shows, or None
+    if results is None:
+        results = run_queries(artist_detail_queries(artist_id, past_page, now))
+    if not results['row']:
+        return None
+
+    artist = results['row'][0]
+    upcoming = results['upcoming']
+    past = results['past']
+    past_shows_count = results['past_shows_count'][0][0]
+    per_page = current_app.config['PAST_SHOWS_PER_PAGE']
+
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": genre_names(results['genres']),
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "facebook_link": artist.facebook_link,
+        "image_link": artist.image_link,
+        "seeking_description": artist.seeking_description,
+        "website": artist.website,
+        "past_shows": [show._asdict() for show in past],
+        "upcoming_shows": [show._asdict() for show in upcoming],
+        "past_shows_count": past_shows_count,
+        "upcoming_shows_count": len(upcoming),
+        "past_page": past_page,
+        "more_past_shows": past_page * per_page < past_shows_count
+    }
+
+#  Search
+#  ----------------------------------------------------------------
+
+def search_ids(model, search_term, page, genre=None):
+    # ranked match on name, city, state and genres from the search backend,
+    # optionally limited to one genre: ids of one page and the total count
+    per_page = current_app.config['SEARCH_RESULTS_PER_PAGE']
+    return get_search_backend().search(model, search_term, per_page, (page - 1) * per_page, genre)
+
+
+def search_rows_query(model, ids):
+    return db.select(
+        model.id,
+        model.name,
+        model.upcoming_shows_count.label('num_upcoming_shows')
+    ).where(model.id.in_(ids))
+
+
+def search_results(model, search_term, page, genre=None, found=None, rows=None):
+    # that page of matches with their upcoming show counts; found and rows
+    # are the results of search_ids() and search_rows_query() if already run
+    if found is None:
+        found = search_ids(model, search_term, page, genre)
+    ids, count = found
+    results = rows
+    if results is None:
+        results = db.session.execute(search_rows_query(model, ids)).all()
+    results = sorted(results, key=lambda result: ids.index(result.id))
+    per_page = current_app.config['SEARCH_RESULTS_PER_PAGE']
+
+    return {
+        "count": count,
+        "page": page,
+        "pages": (count + per_page - 1) // per_page,
+        "data": [{
+            "id": result.id,
+            "name": result.name,
+            "num_upcoming_shows": result.num_upcoming_shows
+        } for result in results]
+    }
+
+#  Shows
+#  ----------------------------------------------------------------
+
+def show_list(after=None, after_id=None):
+    # shows with their venue and artist in one joined query, ordered by
+    # start time; pages continue after the (start_time, id) of the last
+    # show seen (keyset)
+    shows = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id
+    ).filter(Show.start_time.isnot(None))
+
+    if after is not None and after_id is not None:
+        shows = shows.filter(db.tuple_(Show.start_time, Show.id) > (after, after_id))
+    return shows.order_by(Show.start_time, Show.id)
+
+
+def show_row(show):
+    return {
+        "venue_id": show.venue_id,
+        "venue_name": show.venue_name,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist_name,
+        "artist_image_link": show.artist_image_link,
+        "start_time": show.start_time
+    }
+
+
+def shows_page_query(after, after_id):
+    return show_list(after, after_id).limit(current_app.config['SHOWS_PER_PAGE'] + 1).statement
+
+
+def shows_page(after, after_id, rows=None):
+    # one page of shows, and the (start_time, id) cursor of the next page
+    per_page = current_app.config['SHOWS_PER_PAGE']
+    shows = rows
+    if shows is None:
+        shows = db.session.execute(shows_page_query(after, after_id)).all()
+
+    cursor = None
+    if len(shows) > per_page:
+        last = shows[per_page - 1]
+        cursor = (last.start_time, last.id)
+    return [show_row(show) for show in shows[:per_page]], cursor
+
+
+def parse_cursor(after):
+    # start time part of a keyset cursor; None if it isn't a timestamp
+    try:
+        return datetime.fromisoformat(after)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,124 @@
+#----------------------------------------------------------------------------#
+# Cold start report: imports the production entry point (wsgi.py) in a fresh
+# interpreter under `python -X importtime`, with LAZY_STARTUP on and off,
+# and lists the packages and modules that cost the most to import, then
+# times the import and the first request in another fresh interpreter.
+#
+#   python coldstart.py --top 25
+#   python coldstart.py --json coldstart.json
+#
+# Run `flask assets build` first to start from the template bytecode cache.
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+# times one cold start: importing the entry point and serving the home page
+STARTUP = '''
+import json, sys, time
+started = time.perf_counter()
+import wsgi
+imported = time.perf_counter()
+response = wsgi.app.test_client().get('/')
+served = time.perf_counter()
+json.dump({
+    'import_ms': round((imported - started) * 1000, 1),
+    'first_request_ms': round((served - imported) * 1000, 1),
+    'status': response.status_code,
+}, sys.stdout)
+'''
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def run(code, lazy, *options):
+    env = dict(os.environ, LAZY_STARTUP='true' if lazy else 'false')
+    return subprocess.run(
+        [sys.executable, *options, '-c', code], env=env, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+
+
+def import_times(lazy):
+    # (module, self ms, cumulative ms, depth) for every module imported
+    result = run('import wsgi', lazy, '-X', 'importtime')
+    if result.returncode:
+        raise RuntimeError(result.stderr)
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules.append({
+                'module': match.group(4),
+                'self_ms': int(match.group(1)) / 1000,
+                'cumulative_ms': int(match.group(2)) / 1000,
+                'depth': len(match.group(3)) // 2,
+            })
+    return modules
+
+
+def first_request(lazy):
+    result = run(STARTUP, lazy)
+    if result.returncode:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout)
+
+
+def report(lazy, top):
+    modules = import_times(lazy)
+    # self time summed over each top-level package, e.g. all of sqlalchemy
+    packages = {}
+    for module in modules:
+        package = module['module'].split('.')[0]
+        packages[package] = round(packages.get(package, 0) + module['self_ms'], 1)
+    return {
+        'lazy_startup': lazy,
+        'modules': len(modules),
+        'import_self_ms': round(sum(module['self_ms'] for module in modules), 1),
+        'packages': sorted(packages.items(), key=lambda package: -package[1])[:top],
+        'modules_by_self_ms': sorted(modules, key=lambda module: -module['self_ms'])[:top],
+        'startup': first_request(lazy),
+    }
+
+
+def print_report(result):
+    print('LAZY_STARTUP={}: {} modules, {:.1f} ms importing, {} ms to import wsgi, {} ms first request'.format(
+        str(result['lazy_startup']).lower(), result['modules'], result['import_self_ms'],
+        result['startup']['import_ms'], result['startup']['first_request_ms']
+    ))
+    print('  {:>10}  {}'.format('self ms', 'package'))
+    for package, self_ms in result['packages']:
+        print('  {:>10.1f}  {}'.format(self_ms, package))
+    print('  {:>10} {:>10}  {}'.format('self ms', 'cumul. ms', 'module'))
+    for module in result['modules_by_self_ms']:
+        print('  {:>10.1f} {:>10.1f}  {}'.format(module['self_ms'], module['cumulative_ms'], module['module']))
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the import time per module of a cold start.')
+    parser.add_argument('--top', type=int, default=20, help='modules listed per table')
+    parser.add_argument('--json', metavar='FILE', help='also write the full report to FILE')
+    parser.add_argument('--lazy', choices=['on', 'off', 'both'], default='both', help='LAZY_STARTUP modes to measure')
+    args = parser.parse_args()
+
+    modes = {'on': [True], 'off': [False], 'both': [False, True]}[args.lazy]
+    results = [report(lazy, args.top) for lazy in modes]
+    for result in results:
+        print_report(result)
+    if len(results) == 2:
+        print('lazy startup: {:.1f} ms less importing, {} fewer modules'.format(
+            results[0]['import_self_ms'] - results[1]['import_self_ms'], results[0]['modules'] - results[1]['modules']
+        ))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
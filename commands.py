@@ -0,0 +1,277 @@
+import csv
+import importlib
+import json
+import time
+from datetime import datetime
+
+import click
+import dateutil.parser
+from flask import current_app
+from flask.cli import AppGroup
+
+from models import db, Venue, Artist, Show, Genre
+from search import invalidate_indexes
+from cache import page_cache, MODEL_PAGES
+from export import MODELS, export_lines, gzip_stream
+from counters import roll_forward, reconcile
+from scheduling import naive_local
+
+#----------------------------------------------------------------------------#
+# Catalog commands: flask catalog <command>
+#----------------------------------------------------------------------------#
+
+catalog_cli = AppGroup('catalog', help='Bulk load and maintain venues, artists and shows.')
+
+#  Loading
+#  ----------------------------------------------------------------
+
+def read_rows(file, format=None):
+    # stream dicts from a CSV or NDJSON file, one row at a time
+    format = format or ('csv' if file.name.endswith('.csv') else 'ndjson')
+    if format == 'csv':
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def genre_list(value):
+    # genres as a list, a comma separated string or an array literal such
+    # as '{Jazz,"Rock n Roll"}'
+    if not value:
+        return []
+    if isinstance(value, str):
+        if value.startswith('{') and value.endswith('}'):
+            value = next(csv.reader([value[1:-1]], escapechar='\\'), [])
+        else:
+            value = value.split(',')
+    return list(dict.fromkeys(genre.strip() for genre in value if genre.strip()))
+
+
+def convert(column, value):
+    if value is None or value == '':
+        return None
+    python_type = column.type.python_type
+    if python_type is bool and isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 't', 'yes', 'y')
+    if python_type is int:
+        return int(value)
+    if python_type is datetime:
+        if isinstance(value, str):
+            value = dateutil.parser.parse(value)
+        # stored in local time, like the shows scheduled through the app
+        return naive_local(value)
+    return value
+
+
+def table_row(table, row):
+    # keep the table's columns, converted to their types; id and columns
+    # with a default are left to the database when missing
+    values = {}
+    for column in table.columns:
+        value = convert(column, row.get(column.name))
+        if value is not None or (not column.primary_key and column.default is None):
+            values[column.name] = value
+    return values
+
+
+class Loader:
+    # inserts rows in executemany batches, one transaction per batch; genres
+    # are linked through the association table in the same transaction
+
+    def __init__(self, model, batch_size):
+        self.table = model.__table__
+        self.batch_size = batch_size
+        self.batch = []
+        self.batch_genres = []
+        self.loaded = 0
+        self.skipped = 0
+        self.started = time.perf_counter()
+
+        relationship = model.__mapper__.relationships.get('genres')
+        self.genres = relationship.secondary if relationship is not None else None
+        if self.genres is not None:
+            self.genre_key = next(column.name for column in self.genres.columns if column.name != 'genre_id')
+            self.genre_ids = dict(db.session.query(Genre.name, Genre.id))
+
+    def add(self, row):
+        if row is None:
+            self.skipped += 1
+            return
+        genres = genre_list(row.get('genres')) if self.genres is not None else []
+        row = table_row(self.table, row)
+        # executemany needs the same columns in every row of a batch
+        if self.batch and self.batch[-1].keys() != row.keys():
+            self.flush()
+        self.batch.append(row)
+        self.batch_genres.append(genres)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def genre_id(self, name):
+        if name not in self.genre_ids:
+            result = db.session.execute(Genre.__table__.insert(), {'name': name})
+            self.genre_ids[name] = result.inserted_primary_key[0]
+        return self.genre_ids[name]
+
+    def flush(self):
+        if not self.batch:
+            return
+        links = []
+        if self.genres is not None:
+            # genre links need the ids of the new rows up front
+            missing = [row for row in self.batch if 'id' not in row]
+            for row, id in zip(missing, allocate_ids(self.table, len(missing))):
+                row['id'] = id
+            links = [
+                {self.genre_key: row['id'], 'genre_id': self.genre_id(name)}
+                for row, names in zip(self.batch, self.batch_genres) for name in names
+            ]
+
+        db.session.execute(self.table.insert(), self.batch)
+        if links:
+            db.session.execute(self.genres.insert(), links)
+        db.session.commit()
+        self.loaded += len(self.batch)
+        self.batch = []
+        self.batch_genres = []
+
+    def finish(self):
+        self.flush()
+        reset_sequence(self.table)
+        elapsed = time.perf_counter() - self.started
+        click.echo('{}: {} rows in {:.2f}s ({:.0f} rows/s), {} skipped'.format(
+            self.table.name, self.loaded, elapsed, self.loaded / elapsed if elapsed else 0, self.skipped
+        ))
+
+
+def allocate_ids(table, count):
+    # reserve ids for rows inserted without one
+    if not count:
+        return []
+    if db.engine.dialect.name == 'postgresql':
+        return [id for id, in db.session.execute(db.text(
+            "SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"
+        ), {'table': table.name, 'count': count})]
+    start = (db.session.query(db.func.max(table.c.id)).scalar() or 0) + 1
+    return list(range(start, start + count))
+
+
+def reset_sequence(table):
+    # rows loaded with explicit ids leave PostgreSQL's id sequence behind
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text(
+            "SELECT setval(pg_get_serial_sequence(:table, 'id'), COALESCE(MAX(id), 1)) FROM {}".format(table.name)
+        ), {'table': table.name})
+        db.session.commit()
+
+
+def show_resolver():
+    # map venue/artist names to ids once, so each show row is resolved
+    # without a query
+    venue_ids = dict(db.session.query(Venue.name, Venue.id))
+    artist_ids = dict(db.session.query(Artist.name, Artist.id))
+
+    def resolve(row):
+        row = dict(row)
+        if not row.get('venue_id'):
+            row['venue_id'] = venue_ids.get(row.get('venue_name'))
+        if not row.get('artist_id'):
+            row['artist_id'] = artist_ids.get(row.get('artist_name'))
+        if not row['venue_id'] or not row['artist_id']:
+            return None
+        return row
+    return resolve
+
+
+def load_rows(kind, rows, batch_size):
+    loader = Loader(MODELS[kind], batch_size)
+    resolve = show_resolver() if kind == 'shows' else (lambda row: row)
+    for row in rows:
+        loader.add(resolve(row))
+    loader.finish()
+
+
+def invalidate_caches():
+    # bulk inserts bypass the ORM events that keep the caches current. Only
+    # a shared (redis) page cache can be cleared from here; the in-process
+    # one belongs to the server's own processes.
+    for model in MODELS.values():
+        invalidate_indexes(model)
+    if current_app.config['PAGE_CACHE_BACKEND'] != 'redis':
+        click.echo(
+            'Warning: a running server keeps its cached pages until they time out '
+            '(PAGE_CACHE_TIMEOUT={}s) or it restarts; set PAGE_CACHE_BACKEND=redis '
+            'to clear them on load.'.format(current_app.config['PAGE_CACHE_TIMEOUT']), err=True
+        )
+        return
+    for model in MODELS.values():
+        page_cache.invalidate(MODEL_PAGES[model])
+
+
+@catalog_cli.command('load')
+@click.argument('kind', type=click.Choice(list(MODELS)))
+@click.argument('file', type=click.File('r'))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per insert and transaction.')
+def load(kind, file, format, batch_size):
+    """Load venues, artists or shows from a CSV or NDJSON file.
+
+    Shows may name their venue and artist (venue_name, artist_name)
+    instead of giving their ids.
+    """
+    load_rows(kind, read_rows(file, format), batch_size)
+    if kind == 'shows':
+        reconcile()
+    invalidate_caches()
+
+
+@catalog_cli.command('seed')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per insert and transaction.')
+def seed(batch_size):
+    """Load the sample catalog from the data/ modules."""
+    for kind in ('venues', 'artists', 'shows'):
+        module = importlib.import_module('data.' + kind)
+        if kind == 'shows':
+            rows = module.data
+        else:
+            rows = [value for name, value in sorted(vars(module).items()) if name.startswith('data')]
+        load_rows(kind, rows, batch_size)
+    reconcile()
+    invalidate_caches()
+
+#  Upcoming show counters
+#  ----------------------------------------------------------------
+
+@catalog_cli.command('roll-forward')
+def roll_forward_command():
+    """Update the upcoming show counters for shows that have started.
+
+    Run this every minute or so, e.g. from cron.
+    """
+    updated = roll_forward()
+    click.echo('{} venues, {} artists updated'.format(updated[Venue], updated[Artist]))
+
+
+@catalog_cli.command('reconcile')
+def reconcile_command():
+    """Recompute every upcoming show counter from the shows table."""
+    updated = reconcile()
+    click.echo('{} venues, {} artists updated'.format(updated[Venue], updated[Artist]))
+
+#  Export
+#  ----------------------------------------------------------------
+
+@catalog_cli.command('export')
+@click.argument('kind', type=click.Choice(list(MODELS)))
+@click.option('--format', type=click.Choice(['ndjson', 'csv']), default='ndjson', show_default=True)
+@click.option('--since', type=click.DateTime(), help='Only rows written after this time (UTC).')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip-compress the output.')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Defaults to stdout.')
+def export(kind, format, since, compress, output):
+    """Stream a table to NDJSON or CSV with constant memory."""
+    lines = export_lines(MODELS[kind], format, since)
+    chunks = gzip_stream(lines) if compress else (line.encode() for line in lines)
+    for chunk in chunks:
+        output.write(chunk)
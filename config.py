@@ -1,13 +1,122 @@
 import os
-SECRET_KEY = os.urandom(32)
+import tempfile
+
+# Profile: 'development' (the default) or 'production', set by FYYUR_ENV.
+# Production turns debug mode off and needs a SECRET_KEY shared by every
+# worker, so sessions and flashed messages survive across workers and
+# restarts.
+FYYUR_ENV = os.environ.get('FYYUR_ENV', 'development')
+PRODUCTION = FYYUR_ENV == 'production'
+
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    if PRODUCTION:
+        raise RuntimeError('SECRET_KEY must be set when FYYUR_ENV=production')
+    SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+# Leave out what only the flask CLI uses (migrations, catalog commands) for
+# a faster cold start; wsgi.py and asgi.py turn this on
+LAZY_STARTUP = os.environ.get('LAZY_STARTUP', 'false').lower() in ('1', 'true', 'yes')
+
 # Enable debug mode.
-DEBUG = True
+DEBUG = not PRODUCTION
 
 # Connect to the database
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://annajezierska@localhost:5432/fyyur'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres://annajezierska@localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool. Each process holds up to DB_POOL_SIZE connections, plus
+# DB_MAX_OVERFLOW more under load; a request waits up to DB_POOL_TIMEOUT
+# seconds for one before failing. Connections are tested before use
+# (pre-ping) and replaced after DB_POOL_RECYCLE seconds.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+}
+
+# PostgreSQL statement timeout in milliseconds, 0 for none
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+if DB_STATEMENT_TIMEOUT:
+    SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {
+        'options': '-c statement_timeout={}'.format(DB_STATEMENT_TIMEOUT)
+    }
+
+# Number of venues or artists shown per page of search results
+SEARCH_RESULTS_PER_PAGE = 20
+
+# Number of shows shown per page of the /shows listing
+SHOWS_PER_PAGE = 30
+
+# Number of artists shown per page of the /artists directory
+ARTISTS_PER_PAGE = 50
+
+# Number of past shows shown per page on venue and artist pages
+PAST_SHOWS_PER_PAGE = 12
+
+# Per-request SQL instrumentation: send a Server-Timing header with the
+# query count and database time, and log requests over any of these
+# thresholds with their slowest statements
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'true').lower() in ('1', 'true', 'yes')
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_DB_MS = int(os.environ.get('SLOW_REQUEST_DB_MS', 200))
+SLOW_REQUEST_QUERIES = int(os.environ.get('SLOW_REQUEST_QUERIES', 20))
+SLOW_REQUEST_STATEMENTS = 3
+
+# Rendered page cache for the read pages: 'memory' (per process LRU) or
+# 'redis' (shared between workers, needs the redis package)
+PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+PAGE_CACHE_REDIS_URL = os.environ.get('PAGE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+PAGE_CACHE_SIZE = 1024
+# Upper bound in seconds for any cached page
+PAGE_CACHE_TIMEOUT = 300
+
+# Shows have no end time; two shows at one venue or by one artist conflict
+# when they start less than this far apart
+SHOW_LENGTH_MINUTES = 180
+# Most shows listed by one batch request
+SHOW_BATCH_MAX = 500
+
+# Background thread that rolls the upcoming show counters forward as shows
+# start; with several workers one of them (holding the leader lock) does it.
+# It sleeps until the next show starts, at most ROLLOVER_MAX_SLEEP seconds,
+# and followers retry the lock every ROLLOVER_LEADER_RETRY seconds.
+ROLLOVER_SCHEDULER = os.environ.get('ROLLOVER_SCHEDULER', 'true').lower() in ('1', 'true', 'yes')
+ROLLOVER_MAX_SLEEP = 60
+ROLLOVER_LEADER_RETRY = 30
+ROLLOVER_LOCK_FILE = os.environ.get('ROLLOVER_LOCK_FILE', os.path.join(tempfile.gettempdir(), 'fyyur-rollover.lock'))
+
+# Seconds browsers may reuse an autocomplete response
+AUTOCOMPLETE_MAX_AGE = 60
+
+# Rows fetched per batch when streaming API list responses
+API_STREAM_BATCH_SIZE = 500
+
+# Rows fetched per batch from the server-side cursor during exports
+EXPORT_BATCH_SIZE = 1000
+
+# Clients allowed to read the /internal endpoints. Behind a reverse proxy on
+# the same host every request comes from 127.0.0.1, so the address alone
+# proves nothing: with INTERNAL_TOKEN set, requests must also send
+# `Authorization: Bearer <token>`, and in production the endpoints stay off
+# until it is set.
+INTERNAL_HOSTS = os.environ.get('INTERNAL_HOSTS', '127.0.0.1,::1').split(',')
+INTERNAL_TOKEN = os.environ.get('INTERNAL_TOKEN')
+
+# Compiled templates, written by `flask assets build` and loaded instead of
+# compiling each template on its first render
+TEMPLATE_CACHE_DIR = os.path.join(basedir, '.template_cache')
+
+# Output of `flask assets build`, served from /assets; the files are named
+# after their content, so browsers may cache them for a year
+ASSETS_DIST = os.path.join(basedir, 'static', 'dist')
+ASSETS_MAX_AGE = 365 * 24 * 60 * 60
+# `flask assets prune` keeps the outputs of earlier builds written within
+# this many days, for pages and caches that still link to them
+ASSETS_PRUNE_DAYS = 7
@@ -0,0 +1,102 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models import db, Venue, Artist, Show
+from cache import page_cache
+
+#----------------------------------------------------------------------------#
+# Upcoming show counters. Venues and artists keep upcoming_shows_count and
+# next_show_at on their row so listings and searches read them without
+# touching the shows table. They are recomputed for the affected venues
+# and artists in the same transaction as any ORM write to shows; bulk
+# loads call reconcile(). As time passes shows become past, which
+# roll_forward() catches up on for the rows whose next show has started.
+#----------------------------------------------------------------------------#
+
+# show column that points at each model
+SHOW_KEYS = {
+    Venue: Show.venue_id,
+    Artist: Show.artist_id,
+}
+
+# endpoint of each model's detail page in the page cache
+DETAIL_PAGES = {
+    Venue: 'show_venue',
+    Artist: 'show_artist',
+}
+
+
+def upcoming_values(model, now):
+    table = model.__table__
+    upcoming = (SHOW_KEYS[model] == table.c.id, Show.start_time > now)
+    return {
+        'upcoming_shows_count': db.select(db.func.count(Show.id)).where(*upcoming).scalar_subquery(),
+        'next_show_at': db.select(db.func.min(Show.start_time)).where(*upcoming).scalar_subquery()
+    }
+
+
+def refresh(connection, model, now, *filters):
+    # recompute the counters of the model's rows matching filters; only rows
+    # whose counters differ are written, and updated_at is kept, since the
+    # row's own data hasn't changed (incremental exports go by it). Returns
+    # the number of rows updated.
+    table = model.__table__
+    values = upcoming_values(model, now)
+    changed = db.or_(*(table.c[name].is_distinct_from(value) for name, value in values.items()))
+    return connection.execute(
+        table.update().where(*filters, changed).values(updated_at=table.c.updated_at, **values)
+    ).rowcount
+
+
+@event.listens_for(db.session, 'after_flush')
+def refresh_show_changes(session, flush_context):
+    # new, moved and deleted shows, including the venue or artist a show
+    # was moved away from
+    ids = {Venue: set(), Artist: set()}
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Show):
+            state = db.inspect(obj)
+            ids[Venue] |= {obj.venue_id, *state.attrs.venue_id.history.deleted}
+            ids[Artist] |= {obj.artist_id, *state.attrs.artist_id.history.deleted}
+
+    now = datetime.now()
+    for model, model_ids in ids.items():
+        model_ids.discard(None)
+        if model_ids:
+            refresh(session.connection(), model, now, model.__table__.c.id.in_(model_ids))
+            session.info['upcoming_changed'] = True
+
+
+def roll_forward(now=None):
+    # move shows that have started out of the counters; only rows whose next
+    # show is no longer upcoming can be stale. Drops the cached pages of the
+    # rows updated.
+    now = now or datetime.now()
+    updated = {}
+    pages = set()
+    for model, endpoint in DETAIL_PAGES.items():
+        table = model.__table__
+        ids = [id for id, in db.session.execute(db.select(table.c.id).where(table.c.next_show_at <= now))]
+        updated[model] = refresh(db.session, model, now, table.c.id.in_(ids)) if ids else 0
+        pages |= {'{}:{}:'.format(endpoint, id) for id in ids}
+    db.session.commit()
+    if updated[Venue]:
+        pages.add('venues:')
+    page_cache.invalidate(pages)
+    return updated
+
+
+def next_rollover():
+    # when the next upcoming show of any venue or artist starts, or None
+    moments = [db.session.query(db.func.min(model.next_show_at)).scalar() for model in SHOW_KEYS]
+    return min((moment for moment in moments if moment is not None), default=None)
+
+
+def reconcile(now=None):
+    # recompute every counter from the shows table
+    now = now or datetime.now()
+    updated = {model: refresh(db.session, model, now) for model in SHOW_KEYS}
+    db.session.commit()
+    page_cache.invalidate(('venues:',))
+    return updated
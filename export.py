@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from flask import current_app
+
+from models import db, Venue, Artist, Show, Genre
+
+#----------------------------------------------------------------------------#
+# Streaming export of whole tables. Rows are read through a server-side
+# cursor in batches and encoded one at a time, so memory use doesn't grow
+# with the size of the table.
+#----------------------------------------------------------------------------#
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show,
+}
+
+
+def encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def genres_column(model):
+    # comma separated genre names of each venue or artist, if the model has
+    # genres, as a correlated subquery
+    relationship = model.__mapper__.relationships.get('genres')
+    if relationship is None:
+        return None
+    secondary = relationship.secondary
+    key = next(column for column in secondary.columns if column.name != 'genre_id')
+    if db.engine.dialect.name == 'postgresql':
+        names = db.func.string_agg(Genre.name, ',')
+    else:
+        names = db.func.group_concat(Genre.name, ',')
+    return db.select(names).select_from(
+        Genre.__table__.join(secondary, secondary.c.genre_id == Genre.id)
+    ).where(key == model.__table__.c.id).scalar_subquery().label('genres')
+
+
+def export_columns(model):
+    columns = list(model.__table__.columns)
+    genres = genres_column(model)
+    return columns + [genres] if genres is not None else columns
+
+
+def export_rows(model, since=None):
+    # every row of the model's table in id order, optionally only rows
+    # written after `since` (updated_at); deletions are not exported
+    table = model.__table__
+    rows = db.session.query(*export_columns(model))
+    if since is not None:
+        rows = rows.filter(table.c.updated_at > since)
+    return rows.order_by(table.c.id).yield_per(current_app.config['EXPORT_BATCH_SIZE'])
+
+
+def export_lines(model, format='ndjson', since=None):
+    columns = [column.name for column in export_columns(model)]
+    rows = export_rows(model, since)
+
+    # a streamed response outlives the request's session, so the query's
+    # session is closed here to give its connection back to the pool
+    try:
+        if format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow([encode(value) for value in row])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for row in rows:
+                yield json.dumps({column: encode(value) for column, value in zip(columns, row)}) + '\n'
+    finally:
+        rows.session.close()
+
+
+def gzip_stream(lines, chunk_size=64 * 1024):
+    # gzip-compress a stream of text, yielding compressed chunks
+    compressor = zlib.compressobj(wbits=31)
+    pending = []
+    size = 0
+    for line in lines:
+        data = line.encode()
+        pending.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield compressor.compress(b''.join(pending))
+            pending = []
+            size = 0
+    yield compressor.compress(b''.join(pending)) + compressor.flush()
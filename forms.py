@@ -1,7 +1,98 @@
+import threading
+import time
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, NumberRange
+from sqlalchemy import event
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, InputRequired, AnyOf, URL, NumberRange
+
+from models import db, Genre
+
+#----------------------------------------------------------------------------#
+# Choices.
+#----------------------------------------------------------------------------#
+
+STATES = (
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID', 'IL',
+    'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC',
+    'ND', 'OH', 'OK', 'OR', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'PA', 'RI', 'SC', 'SD',
+    'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY'
+)
+
+GENRES = (
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+    'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk',
+    'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other'
+)
+
+
+class ChoiceRegistry:
+    # choice lists shared by every form: each is built once by its builder
+    # and kept until invalidated or older than `ttl` seconds (other workers'
+    # writes), instead of being copied into every form instance
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.builders = {}
+        self.choices = {}
+
+    def register(self, name, builder):
+        self.builders[name] = builder
+
+    def get(self, name):
+        entry = self.choices.get(name)
+        if entry is None or entry[1] + self.ttl < time.monotonic():
+            choices = tuple(self.builders[name]())
+            with self.lock:
+                self.choices[name] = entry = (choices, time.monotonic())
+        return entry[0]
+
+    def invalidate(self, name):
+        with self.lock:
+            self.choices.pop(name, None)
+
+
+def genre_choices():
+    # the standard genres plus any added through the catalog, 'Other' last
+    names = set(GENRES) | {name for name, in db.session.query(Genre.name)}
+    return [(name, name) for name in sorted(names, key=lambda name: (name == 'Other', name))]
+
+
+choice_registry = ChoiceRegistry()
+choice_registry.register('states', lambda: [(state, state) for state in STATES])
+choice_registry.register('genres', genre_choices)
+
+
+@event.listens_for(db.session, 'before_flush')
+def collect_new_genres(session, flush_context, instances):
+    if any(isinstance(obj, Genre) for obj in session.new):
+        session.info['new_genres'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def refresh_genre_choices(session):
+    if session.info.pop('new_genres', False):
+        choice_registry.invalidate('genres')
+
+
+class SharedSelectField(SelectField):
+    # choices come from the registry by name and aren't copied per form
+
+    def __init__(self, label=None, validators=None, choices_name=None, **kwargs):
+        super().__init__(label, validators, **kwargs)
+        self.choices = choice_registry.get(choices_name)
+
+
+class SharedSelectMultipleField(SelectMultipleField):
+
+    def __init__(self, label=None, validators=None, choices_name=None, **kwargs):
+        super().__init__(label, validators, **kwargs)
+        self.choices = choice_registry.get(choices_name)
+
+#----------------------------------------------------------------------------#
+# Forms.
+#----------------------------------------------------------------------------#
 
 class ShowForm(Form):
     artist_id = StringField(
@@ -16,6 +107,32 @@ class ShowForm(Form):
         default= datetime.today()
     )
 
+class ShowSeriesForm(Form):
+    # a run of shows of one artist at one venue, e.g. a weekly residency
+    artist_id = IntegerField(
+        'artist_id', validators=[DataRequired()]
+    )
+    venue_id = IntegerField(
+        'venue_id', validators=[DataRequired()]
+    )
+    start_time = DateTimeField(
+        'start_time',
+        # InputRequired: DataRequired would replace a parse error with
+        # 'This field is required.'
+        validators=[InputRequired()],
+        # the placeholder's format first, which is also how it is shown
+        format=['%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S'],
+        default=datetime.today
+    )
+    every_days = IntegerField(
+        'every_days', validators=[DataRequired(), NumberRange(min=1, max=365)],
+        default=7
+    )
+    count = IntegerField(
+        'count', validators=[DataRequired(), NumberRange(min=1, max=100)],
+        default=12
+    )
+
 class VenueForm(Form):
     name = StringField(
         'name', validators=[DataRequired()]
@@ -23,61 +140,9 @@ class VenueForm(Form):
     city = StringField(
         'city', validators=[DataRequired()]
     )
-    state = SelectField(
+    state = SharedSelectField(
         'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        choices_name='states'
     )
     address = StringField(
         'address', validators=[DataRequired()]
@@ -88,30 +153,9 @@ class VenueForm(Form):
     image_link = StringField(
         'image_link'
     )
-    genres = SelectMultipleField(
-        # TODO implement enum restriction
+    genres = SharedSelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices_name='genres'
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL()]
@@ -131,61 +175,9 @@ class ArtistForm(Form):
     city = StringField(
         'city', validators=[DataRequired()]
     )
-    state = SelectField(
+    state = SharedSelectField(
         'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        choices_name='states'
     )
     phone = StringField(
         # TODO implement validation logic for state
@@ -194,30 +186,9 @@ class ArtistForm(Form):
     image_link = StringField(
         'image_link'
     )
-    genres = SelectMultipleField(
-        # TODO implement enum restriction
+    genres = SharedSelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices_name='genres'
     )
     facebook_link = StringField(
         # TODO implement enum restriction
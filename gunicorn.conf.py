@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+
+#----------------------------------------------------------------------------#
+# gunicorn settings for production: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The app is loaded once in the master and forked into WEB_CONCURRENCY
+# worker processes of GUNICORN_THREADS threads each. Give every worker a
+# DB_POOL_SIZE of at least its thread count.
+#
+# Graceful restarts: `kill -HUP <master>` starts new workers and lets the
+# old ones finish their requests. Because the app is preloaded, new code is
+# only picked up by a new master: `kill -USR2 <master>` starts one next to
+# the old, then `kill -TERM <old master>` once it is serving.
+#----------------------------------------------------------------------------#
+
+bind = os.environ.get('BIND', '0.0.0.0:{}'.format(os.environ.get('PORT', 8000)))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+
+# seconds a request may take before its worker is restarted, and a stopping
+# worker has to finish its requests
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# recycle workers now and then to bound slow memory growth; the jitter keeps
+# them from restarting all at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+# the production profile of config.py
+raw_env = ['FYYUR_ENV=production']
+
+
+def post_fork(server, worker):
+    # connections the master opened while loading the app belong to it;
+    # drop them from the worker's pool without closing them, so the
+    # worker opens its own
+    from wsgi import app
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,117 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request SQL instrumentation: statement count, time spent in the
+# database and the slowest statements of each request, reported in a
+# Server-Timing header and logged when a request crosses the SLOW_REQUEST_*
+# thresholds.
+#----------------------------------------------------------------------------#
+
+class QueryStats:
+
+    def __init__(self, slowest=3):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []
+        self.keep = slowest
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        if self.keep:
+            self.slowest.append((duration, statement))
+            self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+            del self.slowest[self.keep:]
+
+
+# QueryStats collecting every statement of their thread, used by
+# assert_max_queries and the benchmark; background threads such as the
+# rollover scheduler don't count
+local = threading.local()
+
+
+def recorders():
+    if not hasattr(local, 'recorders'):
+        local.recorders = []
+    return local.recorders
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def end_query(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_started'].pop()
+    stats = g.get('query_stats') if has_request_context() else None
+    for recorder in ([stats] if stats is not None else []) + recorders():
+        recorder.record(statement, duration)
+
+
+@event.listens_for(Engine, 'handle_error')
+def failed_query(context):
+    # a statement that raises never reaches after_cursor_execute
+    connection = context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+def server_timing(stats, total):
+    return 'db;desc="{} queries";dur={:.2f}, total;dur={:.2f}'.format(stats.count, stats.duration * 1000, total * 1000)
+
+
+def setup_instrumentation(app):
+    slowest = app.config['SLOW_REQUEST_STATEMENTS']
+
+    @app.before_request
+    def before_request():
+        g.request_started = time.perf_counter()
+        g.query_stats = QueryStats(slowest)
+
+    @app.after_request
+    def after_request(response):
+        # streamed responses keep querying after this point; only the
+        # queries made before the first byte are counted
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        total = time.perf_counter() - g.request_started
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = server_timing(stats, total)
+
+        if (total * 1000 >= app.config['SLOW_REQUEST_MS']
+                or stats.duration * 1000 >= app.config['SLOW_REQUEST_DB_MS']
+                or stats.count >= app.config['SLOW_REQUEST_QUERIES']):
+            app.logger.warning('slow request %s %s: %.1fms, %d queries in %.1fms%s', request.method, request.full_path.rstrip('?'),
+                total * 1000, stats.count, stats.duration * 1000,
+                ''.join('\n  %.1fms %s' % (duration * 1000, ' '.join(statement.split())[:500])
+                        for duration, statement in stats.slowest))
+        return response
+
+#----------------------------------------------------------------------------#
+# Test helper.
+#----------------------------------------------------------------------------#
+
+@contextmanager
+def assert_max_queries(limit):
+    # fails if the block runs more than `limit` statements, listing the
+    # slowest of them, e.g.
+    #
+    #   with assert_max_queries(4):
+    #       client.get('/venues')
+    stats = QueryStats(slowest=limit + 1)
+    recorders().append(stats)
+    try:
+        yield stats
+    finally:
+        recorders().remove(stats)
+    assert stats.count <= limit, '{} queries, expected at most {}:\n{}'.format(
+        stats.count, limit, '\n'.join(statement for duration, statement in stats.slowest)
+    )
@@ -0,0 +1,35 @@
+import hmac
+
+from flask import Blueprint, abort, current_app, jsonify, request
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Internal endpoints for operators, only answered for INTERNAL_HOSTS and,
+# when INTERNAL_TOKEN is set, requests carrying it as a bearer token.
+#----------------------------------------------------------------------------#
+
+internal = Blueprint('internal', __name__)
+
+
+@internal.before_request
+def internal_only():
+    if request.remote_addr not in current_app.config['INTERNAL_HOSTS']:
+        abort(404)
+    token = current_app.config['INTERNAL_TOKEN']
+    if not token:
+        # a proxy on the same host makes every client look local
+        if current_app.config['PRODUCTION']:
+            abort(404)
+        return
+    scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(given.encode(), token.encode()):
+        abort(404)
+
+
+@internal.route('/pool')
+def pool():
+    # live connection pool state and checkout wait times of this process
+    pool = db.engine.pool
+    metrics = pool.metrics() if hasattr(pool, 'metrics') else {"status": pool.status()}
+    return jsonify(dict(pool=type(pool).__name__, **metrics))
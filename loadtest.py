@@ -0,0 +1,177 @@
+#----------------------------------------------------------------------------#
+# Load test: seeds a synthetic catalog (see benchmark.py), then starts the
+# app under the development server and under gunicorn (gunicorn.conf.py) in
+# turn, drives each with concurrent clients over HTTP for a fixed time and
+# reports throughput and latency side by side.
+#
+#   python loadtest.py --concurrency 32 --duration 20 --workers 4 --threads 4
+#
+# Both servers run the production profile, so only the server differs. The
+# clients run in this process; on a small machine they compete with the
+# servers for the CPU, so compare the two runs rather than the absolute
+# numbers.
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmark import percentile, routes, seed
+
+SERVERS = {
+    # the single-process, threaded server behind `python app.py`
+    'development': [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--no-reload', '--with-threads', '--port', '{port}'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:{port}', 'wsgi:app'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(name, port, env):
+    command = [part.format(port=port) for part in SERVERS[name]]
+    server = subprocess.Popen(
+        command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('{} exited with {}'.format(name, server.returncode))
+        try:
+            urllib.request.urlopen('http://127.0.0.1:{}/'.format(port), timeout=1).read()
+            return server
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError('{} did not start'.format(name))
+
+
+def stop_server(server):
+    os.killpg(server.pid, signal.SIGTERM)
+    try:
+        server.wait(30)
+    except subprocess.TimeoutExpired:
+        os.killpg(server.pid, signal.SIGKILL)
+        server.wait()
+
+#----------------------------------------------------------------------------#
+# Clients.
+#----------------------------------------------------------------------------#
+
+def client(base, deadline, venues, artists, random_seed, latencies, errors):
+    # requests a random read route after another until the deadline
+    rng = random.Random(random_seed)
+    read = routes(rng, venues, artists, False)
+    while time.time() < deadline:
+        route, method, url, data = rng.choice(read)
+        body = urllib.parse.urlencode(data(), doseq=True).encode() if data else None
+        started = time.perf_counter()
+        try:
+            path = urllib.parse.quote(url(), safe='/?=&')
+            urllib.request.urlopen(urllib.request.Request(base + path, data=body, method=method), timeout=30).read()
+            latencies.append(time.perf_counter() - started)
+        except (urllib.error.URLError, OSError):
+            errors.append(route)
+
+
+def load(base, concurrency, duration, venues, artists, random_seed):
+    latencies = []
+    errors = []
+    deadline = time.time() + duration
+    clients = [
+        threading.Thread(target=client, args=(base, deadline, venues, artists, random_seed + number, latencies, errors))
+        for number in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+    }
+
+#----------------------------------------------------------------------------#
+# Main.
+#----------------------------------------------------------------------------#
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the development server with gunicorn under load.')
+    parser.add_argument('--venues', type=int, default=500)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1, help='random seed of the catalog and the request mix')
+    parser.add_argument('--database-url', default='sqlite:///' + os.path.join(tempfile.gettempdir(), 'fyyur-loadtest.db'))
+    parser.add_argument('--no-seed', action='store_true', help='use the catalog already in the database')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=15, help='seconds of load per server')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds of untimed load per server')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() * 2 + 1, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--server', action='append', choices=list(SERVERS), help='only these servers (repeatable)')
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        DATABASE_URL=args.database_url,
+        FYYUR_ENV='production',
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'loadtest'),
+        SERVER_TIMING='false',
+        ROLLOVER_SCHEDULER='false',
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        DB_POOL_SIZE=str(max(args.threads, 5)),
+    )
+    if not args.no_seed:
+        os.environ.update(env)
+        from app import app
+        print('seeding {} venues, {} artists, {} shows'.format(args.venues, args.artists, args.shows), file=sys.stderr)
+        seed(app, args.venues, args.artists, args.shows, 5000, args.seed)
+
+    results = {}
+    for name in args.server or list(SERVERS):
+        port = free_port()
+        server = start_server(name, port, env)
+        try:
+            base = 'http://127.0.0.1:{}'.format(port)
+            load(base, args.concurrency, args.warmup, args.venues, args.artists, args.seed)
+            results[name] = load(base, args.concurrency, args.duration, args.venues, args.artists, args.seed)
+        finally:
+            stop_server(server)
+        print('{}: {}'.format(name, results[name]), file=sys.stderr)
+
+    print('{:<12} {:>9} {:>8} {:>9} {:>9} {:>9}'.format('server', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms'))
+    for name, result in results.items():
+        print('{:<12} {:>9} {:>8} {:>9} {:>9} {:>9}'.format(
+            name, result['requests'], result['errors'], result['requests_per_second'], result['p50_ms'], result['p95_ms']
+        ))
+    if len(results) == 2 and results['development']['requests_per_second']:
+        print('gunicorn: {:.1f}x the throughput of the development server'.format(
+            results['gunicorn']['requests_per_second'] / results['development']['requests_per_second']
+        ))
+
+
+if __name__ == '__main__':
+    main()
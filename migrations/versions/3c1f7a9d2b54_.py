@@ -0,0 +1,30 @@
+"""add show and venue area indexes
+
+Revision ID: 3c1f7a9d2b54
+Revises: f9489882cb1a
+Create Date: 2026-10-18 09:12:40.512376
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f7a9d2b54'
+down_revision = 'f9489882cb1a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # upcoming/past show lookups filter on one foreign key and a start_time range
+    op.create_index('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'], unique=False)
+    # /venues groups venues by area
+    op.create_index('ix_venues_city_state', 'venues', ['city', 'state'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venues_city_state', table_name='venues')
+    op.drop_index('ix_show_artist_id_start_time', table_name='show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='show')
@@ -0,0 +1,48 @@
+"""add upcoming show counters to venues and artists
+
+Revision ID: 5f0c2e9a7b13
+Revises: d3a8f61c07e2
+Create Date: 2026-10-18 16:40:19.662045
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0c2e9a7b13'
+down_revision = 'd3a8f61c07e2'
+branch_labels = None
+depends_on = None
+
+# table and its key column in show
+COUNTER_TABLES = [
+    ('venues', 'venue_id'),
+    ('artists', 'artist_id'),
+]
+
+
+def upgrade():
+    for table, key in COUNTER_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('next_show_at', sa.DateTime(), nullable=True))
+            batch_op.create_index('ix_{}_next_show_at'.format(table), ['next_show_at'], unique=False)
+
+        # same as counters.reconcile(); the app compares show times with
+        # its local time
+        upcoming = 'FROM show WHERE show.{key} = {table}.id AND show.start_time > :now'.format(table=table, key=key)
+        op.get_bind().execute(sa.text(
+            'UPDATE {table} SET upcoming_shows_count = (SELECT count(show.id) {upcoming}), '
+            'next_show_at = (SELECT min(show.start_time) {upcoming})'.format(table=table, upcoming=upcoming)
+        ), {'now': datetime.now()})
+
+
+def downgrade():
+    for table, key in reversed(COUNTER_TABLES):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_index('ix_{}_next_show_at'.format(table))
+            batch_op.drop_column('next_show_at')
+            batch_op.drop_column('upcoming_shows_count')
@@ -0,0 +1,44 @@
+"""add trigram search indexes
+
+Revision ID: 8e2d5b0c4f19
+Revises: 3c1f7a9d2b54
+Create Date: 2026-10-18 11:03:27.884106
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2d5b0c4f19'
+down_revision = '3c1f7a9d2b54'
+branch_labels = None
+depends_on = None
+
+# columns searched by search.TrigramSearch
+SEARCH_COLUMNS = {
+    'venues': ['name', 'city', 'state', 'genres'],
+    'artists': ['name', 'city', 'state', 'genres'],
+}
+
+
+def upgrade():
+    # pg_trgm only exists on PostgreSQL; other databases use the
+    # in-process n-gram index in search.py instead
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, columns in SEARCH_COLUMNS.items():
+        for column in columns:
+            op.create_index(
+                'ix_{}_{}_trgm'.format(table, column), table, [column], unique=False,
+                postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'}
+            )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, columns in SEARCH_COLUMNS.items():
+        for column in columns:
+            op.drop_index('ix_{}_{}_trgm'.format(table, column), table_name=table)
@@ -0,0 +1,29 @@
+"""index artists by name and initial for the directory pages
+
+Revision ID: a6c93e0d4b71
+Revises: 5f0c2e9a7b13
+Create Date: 2026-10-18 18:05:42.318276
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c93e0d4b71'
+down_revision = '5f0c2e9a7b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('artists') as batch_op:
+        batch_op.create_index('ix_artists_name_id', ['name', 'id'], unique=False)
+    # pages of one letter filter on the upper-cased initial
+    op.create_index('ix_artists_initial_name_id', 'artists', [sa.text('upper(substr(name, 1, 1))'), 'name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artists_initial_name_id', table_name='artists')
+    with op.batch_alter_table('artists') as batch_op:
+        batch_op.drop_index('ix_artists_name_id')
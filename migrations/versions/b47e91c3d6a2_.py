@@ -0,0 +1,38 @@
+"""add updated_at to venues, artists and show
+
+Revision ID: b47e91c3d6a2
+Revises: 8e2d5b0c4f19
+Create Date: 2026-10-18 13:41:05.227918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47e91c3d6a2'
+down_revision = '8e2d5b0c4f19'
+branch_labels = None
+depends_on = None
+
+
+def utc_now():
+    # in UTC, like the models' datetime.utcnow default; now() is local time
+    # on PostgreSQL, SQLite's CURRENT_TIMESTAMP is UTC already
+    if op.get_bind().dialect.name == 'postgresql':
+        return sa.text("timezone('utc', now())")
+    return sa.text('CURRENT_TIMESTAMP')
+
+
+def upgrade():
+    # existing rows start out as modified at migration time
+    # (SQLite only adds a column with a function default by copying the table)
+    for table in ('venues', 'artists', 'show'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=utc_now(), nullable=False))
+
+
+def downgrade():
+    for table in ('show', 'artists', 'venues'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,99 @@
+"""move genres into a genres table
+
+Revision ID: d3a8f61c07e2
+Revises: b47e91c3d6a2
+Create Date: 2026-10-18 15:12:44.508311
+
+"""
+import csv
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a8f61c07e2'
+down_revision = 'b47e91c3d6a2'
+branch_labels = None
+depends_on = None
+
+# owner table, association table and its key column
+GENRE_TABLES = [
+    ('venues', 'venue_genres', 'venue_id'),
+    ('artists', 'artist_genres', 'artist_id'),
+]
+
+
+def genre_list(value):
+    # genres were stored as array literals ('{Jazz,"Rock n Roll"}') or
+    # comma separated strings
+    if not value:
+        return []
+    if value.startswith('{') and value.endswith('}'):
+        value = next(csv.reader([value[1:-1]], escapechar='\\'), [])
+    else:
+        value = value.split(',')
+    return list(dict.fromkeys(genre.strip() for genre in value if genre.strip()))
+
+
+def upgrade():
+    genres = op.create_table('genres',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for table, association, key in GENRE_TABLES:
+        op.create_table(association,
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([key], [table + '.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['genres.id'], ),
+        sa.PrimaryKeyConstraint(key, 'genre_id')
+        )
+        op.create_index('ix_{}_genre_id_{}'.format(association, key), association, ['genre_id', key], unique=False)
+
+    bind = op.get_bind()
+    genre_ids = {}
+    for table, association, key in GENRE_TABLES:
+        links = []
+        for id, value in bind.execute(sa.text('SELECT id, genres FROM {}'.format(table))):
+            for name in genre_list(value):
+                if name not in genre_ids:
+                    genre_ids[name] = bind.execute(genres.insert().values(name=name)).inserted_primary_key[0]
+                links.append({key: id, 'genre_id': genre_ids[name]})
+        if links:
+            op.bulk_insert(sa.table(association, sa.column(key), sa.column('genre_id')), links)
+
+    for table, association, key in GENRE_TABLES:
+        if bind.dialect.name == 'postgresql':
+            op.drop_index('ix_{}_genres_trgm'.format(table), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('genres')
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table, association, key in GENRE_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.String(), nullable=True))
+        names = {}
+        for id, name in bind.execute(sa.text(
+            'SELECT a.{key}, g.name FROM {association} a JOIN genres g ON g.id = a.genre_id ORDER BY g.name'.format(
+                key=key, association=association
+            )
+        )):
+            names.setdefault(id, []).append(name)
+        for id, genres in names.items():
+            value = '{' + ','.join('"{}"'.format(name.replace('"', '\\"')) for name in genres) + '}'
+            bind.execute(sa.text('UPDATE {} SET genres = :genres WHERE id = :id'.format(table)), {'genres': value, 'id': id})
+        if bind.dialect.name == 'postgresql':
+            op.create_index(
+                'ix_{}_genres_trgm'.format(table), table, ['genres'], unique=False,
+                postgresql_using='gin', postgresql_ops={'genres': 'gin_trgm_ops'}
+            )
+
+    for table, association, key in reversed(GENRE_TABLES):
+        op.drop_index('ix_{}_genre_id_{}'.format(association, key), table_name=association)
+        op.drop_table(association)
+    op.drop_table('genres')
@@ -1,21 +1,140 @@
+import threading
+import time
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 
 db = SQLAlchemy()
 
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+def in_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+    )
+
+
 def setup_db(app):
     app.config.from_object('config')
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    if in_memory_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        # one connection that keeps the database (Flask-SQLAlchemy's
+        # StaticPool), which takes no pool size options
+        for name in POOL_OPTIONS:
+            options.pop(name, None)
+    else:
+        options.setdefault('poolclass', MeteredQueuePool)
     db.app = app
     db.init_app(app)
-    Migrate(app, db)  
+    if not app.config['LAZY_STARTUP']:
+        # flask db ...; alembic is slow to import and serving processes
+        # started with LAZY_STARTUP don't need it
+        from flask_migrate import Migrate
+        Migrate(app, db)
     return db
 
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+class MeteredQueuePool(QueuePool):
+    # QueuePool that records how long checkouts wait for a connection and
+    # how many give up after pool_timeout
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # QueuePool._do_get calls itself again when it loses an overflow
+        # race; only the outermost call of a checkout is measured
+        self.checkout_depth = threading.local()
+        self.metrics_lock = threading.Lock()
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        depth = getattr(self.checkout_depth, 'value', 0)
+        if depth:
+            return super()._do_get()
+
+        self.checkout_depth.value = 1
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self.metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            self.checkout_depth.value = 0
+            waited = time.perf_counter() - started
+            with self.metrics_lock:
+                self.waits += 1
+                self.wait_time += waited
+                self.max_wait_time = max(self.max_wait_time, waited)
+
+    def metrics(self):
+        with self.metrics_lock:
+            return {
+                "size": self.size(),
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": max(self.overflow(), 0),
+                "max_overflow": self._max_overflow,
+                "timeout": self.timeout(),
+                "checkouts": self.waits,
+                "wait_time_total": self.wait_time,
+                "wait_time_avg": self.wait_time / self.waits if self.waits else 0.0,
+                "wait_time_max": self.max_wait_time,
+                "timeouts": self.timeouts
+            }
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id'),
+)
+
+
+class Genre(db.Model):
+    __tablename__ = 'genres'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), unique=True, nullable=False)
+
+    @classmethod
+    def named(cls, names):
+        # genres with the given names, adding any that don't exist yet
+        genres = {genre.name: genre for genre in cls.query.filter(cls.name.in_(names))}
+        for name in names:
+            if name not in genres:
+                genres[name] = cls(name=name)
+                db.session.add(genres[name])
+        return [genres[name] for name in names]
+
+
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_city_state', 'city', 'state'),
+        db.Index('ix_venues_next_show_at', 'next_show_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(), unique=True, nullable=False)
@@ -25,39 +144,73 @@ class Venue(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=venue_genres, order_by='Genre.name', lazy='selectin')
     seeking_talent = db.Column(db.Boolean, nullable=True, default=False)
     seeking_description = db.Column(db.String(500))
     website = db.Column(db.String(120))
+    # maintained from the shows table by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     show = db.relationship('Show', backref='venues', lazy=True)
     pass
 
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_next_show_at', 'next_show_at'),
+        # the /artists directory pages through artists by name
+        db.Index('ix_artists_name_id', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String())
+    genres = db.relationship('Genre', secondary=artist_genres, order_by='Genre.name', lazy='selectin')
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120), default = False)
+    # maintained from the shows table by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     show = db.relationship('Show', backref='artist', lazy=True)
     pass
 
 
+def name_initial(column):
+    # upper-cased first character of a name; the literals are inlined so the
+    # expression matches the index below
+    return db.func.upper(db.func.substr(column, db.literal_column('1'), db.literal_column('1')))
+
+
+# the /artists directory lists one initial at a time, in name order
+db.Index('ix_artists_initial_name_id', name_initial(Artist.name), Artist.name, Artist.id)
+
+
 class Show(db.Model):
     __tablename__ = "show"
-  
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime(), nullable=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     pass
 
 
+@event.listens_for(db.session, 'before_flush')
+def touch_genre_changes(session, flush_context, instances):
+    # a change to genres alone doesn't update the row, so bump updated_at
+    for obj in session.dirty:
+        if isinstance(obj, (Venue, Artist)) and db.inspect(obj).attrs.genres.history.has_changes():
+            obj.updated_at = datetime.utcnow()
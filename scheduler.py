@@ -0,0 +1,150 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy import event, exc
+
+from models import db
+from counters import roll_forward, next_rollover
+
+#----------------------------------------------------------------------------#
+# Show-time rollover. A background thread sleeps until the next upcoming
+# show of any venue or artist starts, then rolls the upcoming show counters
+# forward and drops the affected cached pages (counters.roll_forward). With
+# several workers only the one holding the leader lock does this; the
+# others retry the lock now and then in case the leader goes away.
+#
+# The leader only drops pages from its own in-process cache. Every cached
+# page that changes when a show starts therefore also expires at that time
+# (page_cache.expire_at), so each worker's copies expire on their own
+# whether or not the page cache is shared.
+#----------------------------------------------------------------------------#
+
+# pg_try_advisory_lock key
+LEADER_LOCK_KEY = 0x46797972
+
+
+class LeaderLock:
+    # a PostgreSQL advisory lock held on its own connection, or an flock()
+    # on ROLLOVER_LOCK_FILE for other databases (workers on one host)
+
+    def __init__(self, lock_file):
+        self.lock_file = lock_file
+        self.connection = None
+        self.file = None
+
+    def acquire(self):
+        # True while this process is the leader
+        if db.engine.dialect.name == 'postgresql':
+            return self.acquire_advisory()
+        return self.acquire_file()
+
+    def acquire_advisory(self):
+        if self.connection is not None:
+            try:
+                self.connection.exec_driver_sql('SELECT 1')
+                self.connection.commit()
+                return True
+            except exc.DBAPIError:
+                # the lock went away with the connection
+                self.connection.invalidate()
+                self.connection.close()
+                self.connection = None
+
+        connection = db.engine.connect()
+        leader = connection.scalar(db.text('SELECT pg_try_advisory_lock(:key)'), {'key': LEADER_LOCK_KEY})
+        connection.commit()
+        if leader:
+            self.connection = connection
+        else:
+            connection.close()
+        return leader
+
+    def acquire_file(self):
+        if self.file is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:
+            # no flock(): assume a single worker
+            return True
+        file = open(self.lock_file, 'a')
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        self.file = file
+        return True
+
+
+class RolloverScheduler:
+
+    def __init__(self):
+        self.app = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def init_app(self, app):
+        # the thread starts with the first request, so it runs in each
+        # worker process after a fork and not in CLI commands
+        self.app = app
+        if app.config['ROLLOVER_SCHEDULER']:
+            app.before_request(self.start)
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='rollover', daemon=True)
+                self.thread.start()
+
+    def wake(self):
+        # recompute the next rollover, e.g. after an earlier show was added
+        self.wakeup.set()
+
+    def run(self):
+        leader = LeaderLock(self.app.config['ROLLOVER_LOCK_FILE'])
+        while True:
+            timeout = self.app.config['ROLLOVER_LEADER_RETRY']
+            with self.app.app_context():
+                try:
+                    if leader.acquire():
+                        timeout = self.rollover()
+                except Exception:
+                    self.app.logger.exception('show rollover failed')
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+
+    def rollover(self):
+        # roll forward what has started and return the seconds until the
+        # next show starts, at most ROLLOVER_MAX_SLEEP
+        roll_forward()
+        timeout = self.app.config['ROLLOVER_MAX_SLEEP']
+        next_show = next_rollover()
+        if next_show is not None:
+            timeout = min(timeout, max((next_show - datetime.now()).total_seconds(), 0))
+        return timeout
+
+
+rollover_scheduler = RolloverScheduler()
+
+
+def setup_scheduler(app):
+    rollover_scheduler.init_app(app)
+    return rollover_scheduler
+
+
+@event.listens_for(db.session, 'after_commit')
+def wake_on_show_changes(session):
+    if session.info.pop('upcoming_changed', False):
+        rollover_scheduler.wake()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_show_changes(session):
+    session.info.pop('upcoming_changed', None)
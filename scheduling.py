@@ -0,0 +1,146 @@
+from bisect import bisect_right
+from datetime import timedelta
+
+from flask import current_app
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Show scheduling with conflict detection. Shows have no end time, so each
+# one is taken to last SHOW_LENGTH_MINUTES: two shows at the same venue, or
+# by the same artist, conflict when they start closer together than that.
+# Existing shows are looked up with one range query per side over the
+# (venue_id, start_time) and (artist_id, start_time) indexes.
+#----------------------------------------------------------------------------#
+
+class ScheduleError(Exception):
+    # raised with the problems found; nothing has been inserted
+
+    def __init__(self, problems):
+        super().__init__('{} problem(s) scheduling shows'.format(len(problems)))
+        self.problems = problems
+
+
+def show_length():
+    return timedelta(minutes=current_app.config['SHOW_LENGTH_MINUTES'])
+
+
+def naive_local(value):
+    # start times are stored without a zone, in server local time like the
+    # datetime.now() they are compared with; times with an offset are
+    # converted to it first
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def missing(model, ids):
+    # ids that don't exist; the rows that do are locked until commit so
+    # concurrent batches for the same venue or artist are checked in turn
+    found = {id for id, in db.session.query(model.id).filter(model.id.in_(ids)).with_for_update()}
+    return set(ids) - found
+
+
+def existing_starts(column, wanted, length):
+    # start times of existing shows near the wanted times, per venue or
+    # artist id: one range condition per id, in one query
+    if not wanted:
+        return {}
+    conditions = [
+        db.and_(column == key, Show.start_time > min(times) - length, Show.start_time < max(times) + length)
+        for key, times in wanted.items()
+    ]
+    starts = {}
+    for key, start_time in db.session.query(column, Show.start_time).filter(db.or_(*conditions)):
+        starts.setdefault(key, []).append(start_time)
+    for times in starts.values():
+        times.sort()
+    return starts
+
+
+def side_conflicts(shows, side, length):
+    # conflicts of the new shows with existing shows and with each other on
+    # one side ('venue' or 'artist')
+    column = Show.venue_id if side == 'venue' else Show.artist_id
+    key = side + '_id'
+    wanted = {}
+    for show in shows:
+        wanted.setdefault(show[key], []).append(show['start_time'])
+    existing = existing_starts(column, wanted, length)
+
+    conflicts = []
+    booked = {}
+    for index, show in sorted(enumerate(shows), key=lambda entry: entry[1]['start_time']):
+        start_time = show['start_time']
+        times = existing.get(show[key], [])
+        # first existing show starting after start_time - length
+        position = bisect_right(times, start_time - length)
+        if position < len(times) and times[position] < start_time + length:
+            conflicts.append({
+                "index": index,
+                "start_time": start_time,
+                side + "_id": show[key],
+                "reason": "{} already has a show at {}".format(side, times[position].isoformat())
+            })
+            continue
+        previous = booked.get(show[key])
+        if previous is not None and start_time - shows[previous]['start_time'] < length:
+            conflicts.append({
+                "index": index,
+                "start_time": start_time,
+                side + "_id": show[key],
+                "reason": "overlaps show {} of this batch".format(previous)
+            })
+            continue
+        booked[show[key]] = index
+    return conflicts
+
+
+def find_conflicts(shows):
+    # problems with a batch of shows (dicts with venue_id, artist_id and a
+    # start_time datetime), as a list of dicts with the index of the show
+    missing_venues = missing(Venue, {show['venue_id'] for show in shows})
+    missing_artists = missing(Artist, {show['artist_id'] for show in shows})
+    problems = [
+        {"index": index, "venue_id": show['venue_id'], "reason": "no such venue"}
+        for index, show in enumerate(shows) if show['venue_id'] in missing_venues
+    ] + [
+        {"index": index, "artist_id": show['artist_id'], "reason": "no such artist"}
+        for index, show in enumerate(shows) if show['artist_id'] in missing_artists
+    ]
+    if problems:
+        return problems
+
+    length = show_length()
+    return sorted(
+        side_conflicts(shows, 'venue', length) + side_conflicts(shows, 'artist', length),
+        key=lambda problem: problem['index']
+    )
+
+
+def schedule_shows(shows):
+    # insert all the shows in one transaction, or none of them if any
+    # conflicts; returns the new Show objects
+    shows = [dict(show, start_time=naive_local(show['start_time'])) for show in shows]
+    if not shows:
+        return []
+    if len(shows) > current_app.config['SHOW_BATCH_MAX']:
+        raise ScheduleError([{"reason": "at most {} shows per batch".format(current_app.config['SHOW_BATCH_MAX'])}])
+    problems = find_conflicts(shows)
+    if problems:
+        db.session.rollback()
+        raise ScheduleError(problems)
+
+    new_shows = [Show(**show) for show in shows]
+    db.session.add_all(new_shows)
+    db.session.commit()
+    return new_shows
+
+
+def show_series(venue_id, artist_id, first_start, every_days, count):
+    # a residency: `count` shows, `every_days` apart
+    return [{
+        "venue_id": venue_id,
+        "artist_id": artist_id,
+        "start_time": first_start + timedelta(days=every_days * number)
+    } for number in range(count)]
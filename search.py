@@ -0,0 +1,220 @@
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+from models import db, Venue, Artist, Genre
+
+#----------------------------------------------------------------------------#
+# Search backends.
+#----------------------------------------------------------------------------#
+
+# columns searched for venues and artists, with their weight in the ranking
+SEARCH_FIELDS = (
+    ('name', 1.0),
+    ('city', 0.6),
+    ('state', 0.6),
+)
+
+# weight of a match on one of the venue's or artist's genres
+GENRE_WEIGHT = 0.4
+
+
+class TrigramSearch:
+    # PostgreSQL backend: the ilike filters are served by the pg_trgm GIN
+    # indexes and results are ranked by trigram similarity
+
+    def search(self, model, term, limit, offset, genre=None):
+        columns = [(getattr(model, field), weight) for field, weight in SEARCH_FIELDS]
+        pattern = '%' + term + '%'
+        genres = model.genres.property
+        (_, model_key), = genres.synchronize_pairs
+        (_, genre_key), = genres.secondary_synchronize_pairs
+        genre_match = db.select(model_key).select_from(genres.secondary).join(
+            Genre, Genre.id == genre_key
+        ).where(Genre.name.ilike(pattern))
+        # one select per column, each served by its own trigram index, plus the
+        # genre join; an EXISTS inside an OR of the ilikes would make the
+        # planner give up the bitmap OR and scan the whole table
+        matched = db.union(
+            *[db.select(model.id).where(column.ilike(pattern)) for column, weight in columns], genre_match
+        ).subquery()
+        rank = db.func.greatest(
+            db.case((model.id.in_(genre_match), GENRE_WEIGHT), else_=0),
+            *[db.func.similarity(column, term) * weight for column, weight in columns]
+        )
+
+        matches = db.session.query(model.id).join(matched, matched.c.id == model.id)
+        if genre:
+            matches = matches.filter(model.genres.any(Genre.name == genre))
+        ids = [row.id for row in matches.order_by(
+            rank.desc(), model.name, model.id
+        ).limit(limit).offset(offset)]
+        return ids, matches.count()
+
+
+class ModelIndex:
+    # an in-process index per model, built lazily by build(), dropped when a
+    # write to the model commits and rebuilt after `ttl` seconds (other
+    # workers' and processes' writes)
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.generation = 0
+
+    def invalidate(self, model):
+        with self.lock:
+            self.generation += 1
+            self.indexes.pop(model, None)
+
+    def get_index(self, model):
+        with self.lock:
+            entry = self.indexes.get(model)
+            generation = self.generation
+        if entry is not None and entry[1] + self.ttl >= time.monotonic():
+            return entry[0]
+        index = self.build(model)
+        with self.lock:
+            # skip caching an index that a concurrent commit made stale
+            if generation == self.generation:
+                self.indexes[model] = (index, time.monotonic())
+        return index
+
+
+class NgramSearch(ModelIndex):
+    # in-process fallback for SQLite and tests: a trigram inverted index per
+    # model
+
+    n = 3
+
+    def grams(self, text):
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def build(self, model):
+        genres = {}
+        for id, name in db.session.query(model.id, Genre.name).join(model.genres):
+            genres.setdefault(id, []).append(name)
+
+        docs = {}
+        postings = {}
+        columns = [getattr(model, field) for field, weight in SEARCH_FIELDS]
+        for row in db.session.query(model.id, *columns):
+            names = genres.get(row.id, [])
+            fields = [(value or '').lower() for value in row[1:]] + [name.lower() for name in names]
+            docs[row.id] = (fields, row[1] or '', set(names))
+            for gram in set().union(*[self.grams(value) for value in fields]):
+                postings.setdefault(gram, set()).add(row.id)
+        return docs, postings
+
+    def search(self, model, term, limit, offset, genre=None):
+        docs, postings = self.get_index(model)
+        term = term.lower()
+
+        # narrow down by the term's trigrams, then confirm the substring match
+        candidates = None
+        for gram in self.grams(term):
+            candidates = postings.get(gram, set()) if candidates is None else candidates & postings.get(gram, set())
+            if not candidates:
+                break
+        if candidates is None:
+            candidates = docs.keys()
+
+        results = []
+        for id in candidates:
+            fields, name, genres = docs[id]
+            if genre and genre not in genres:
+                continue
+            weights = [weight for field, weight in SEARCH_FIELDS] + [GENRE_WEIGHT] * len(genres)
+            score = 0
+            for value, weight in zip(fields, weights):
+                if term in value:
+                    # prefer exact and prefix matches over matches inside a word
+                    closeness = 1.0 if value == term else 0.8 if value.startswith(term) else 0.5
+                    score = max(score, weight * closeness)
+            if score:
+                results.append((-score, name, id))
+
+        results.sort()
+        return [id for score, name, id in results[offset:offset + limit]], len(results)
+
+
+class PrefixIndex(ModelIndex):
+    # autocomplete on names: a sorted list of (key, name, id) per model with
+    # one key for each word onwards ('wild sax band', 'sax band', 'band'),
+    # so a prefix is a binary search away
+
+    def build(self, model):
+        entries = []
+        for id, name in db.session.query(model.id, model.name):
+            words = (name or '').lower().split()
+            entries.extend((' '.join(words[start:]), name, id) for start in range(len(words)))
+        entries.sort()
+        return entries
+
+    # matches looked at for one prefix, so short prefixes stay cheap
+    scan = 200
+
+    def complete(self, model, prefix, limit=10):
+        # names with a word starting with prefix, names starting with it first
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        entries = self.get_index(model)
+        matches = {}
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and len(matches) < self.scan:
+            key, name, id = entries[position]
+            if not key.startswith(prefix):
+                break
+            matches[id] = name
+            position += 1
+        results = sorted(matches.items(), key=lambda match: (not match[1].lower().startswith(prefix), match[1]))
+        return [{"id": id, "name": name} for id, name in results[:limit]]
+
+
+ngram_search = NgramSearch()
+prefix_index = PrefixIndex()
+
+
+def invalidate_indexes(model):
+    ngram_search.invalidate(model)
+    prefix_index.invalidate(model)
+
+
+# the indexes are dropped once the write commits: dropped any earlier, a
+# concurrent request could rebuild them from the data before the write
+
+@event.listens_for(db.session, 'before_flush')
+def collect_index_changes(session, flush_context, instances):
+    models = session.info.setdefault('search_index_changes', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Venue, Artist)):
+            models.add(type(obj))
+
+
+# Query.delete()/update() bypass the flush
+@event.listens_for(db.session, 'after_bulk_delete')
+@event.listens_for(db.session, 'after_bulk_update')
+def collect_bulk_index_changes(context):
+    if context.mapper.class_ in (Venue, Artist):
+        context.session.info.setdefault('search_index_changes', set()).add(context.mapper.class_)
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_index_changes(session):
+    for model in session.info.pop('search_index_changes', ()):
+        invalidate_indexes(model)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_index_changes(session):
+    session.info.pop('search_index_changes', None)
+
+
+def get_search_backend():
+    if db.engine.dialect.name == 'postgresql':
+        return TrigramSearch()
+    return ngram_search
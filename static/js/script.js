@@ -2,3 +2,34 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// name lookup for ID fields: <input data-autocomplete="/api/v1/autocomplete/artists"
+// data-target="artist_id" list="..."> suggests names and fills in the chosen ID
+Array.prototype.forEach.call(document.querySelectorAll('input[data-autocomplete]'), function (input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var target = document.getElementById(input.getAttribute('data-target'));
+  var ids = {};
+  var timer;
+
+  input.addEventListener('input', function () {
+    if (ids[input.value]) {
+      target.value = ids[input.value];
+      return;
+    }
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+      fetch(input.getAttribute('data-autocomplete') + '?q=' + encodeURIComponent(input.value))
+        .then(function (response) { return response.json(); })
+        .then(function (results) {
+          list.innerHTML = '';
+          ids = {};
+          results.forEach(function (result) {
+            var option = document.createElement('option');
+            option.value = result.name + ' #' + result.id;
+            list.appendChild(option);
+            ids[option.value] = result.id;
+          });
+        });
+    }, 150);
+  });
+});
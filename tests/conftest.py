@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# the app reads its configuration from the environment when imported
+DATABASE = os.path.join(tempfile.mkdtemp(), 'fyyur-test.db')
+os.environ.update(
+    DATABASE_URL='sqlite:///' + DATABASE,
+    FYYUR_ENV='development',
+    ROLLOVER_SCHEDULER='false',
+    SERVER_TIMING='false',
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as fyyur_app
+from models import db
+from cache import page_cache
+from search import ngram_search, prefix_index
+
+
+@pytest.fixture
+def app():
+    # an empty database for each test
+    with fyyur_app.app_context():
+        db.create_all()
+        yield fyyur_app
+        db.session.remove()
+        db.drop_all()
+    page_cache.backend.clear()
+    for index in (ngram_search, prefix_index):
+        index.indexes.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
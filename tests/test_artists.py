@@ -0,0 +1,32 @@
+from models import db, Artist
+from catalog import artists_page, letter_filter
+
+
+def add_artists(*names):
+    db.session.add_all(Artist(name=name) for name in names)
+    db.session.commit()
+
+
+def names(letter):
+    return [artist.name for artist in artists_page([], letter)[0]]
+
+
+def test_letters_ignore_case(app):
+    add_artists('alpha', 'Apex', 'beta', 'Zed', 'zulu')
+    assert names('A') == ['Apex', 'alpha']
+    assert names('B') == ['beta']
+    assert names('Z') == ['Zed', 'zulu']
+    assert names('#') == []
+
+
+def test_other_initials_go_under_hash(app):
+    add_artists('2 Chainz', '!!!', 'Étienne', '[bracket]', 'Eve')
+    assert sorted(names('#')) == sorted(['2 Chainz', '!!!', 'Étienne', '[bracket]'])
+    assert names('E') == ['Eve']
+
+
+def test_letter_pages_use_the_initial_index(app):
+    query = db.session.query(Artist.id, Artist.name).filter(letter_filter(Artist.name, 'M')).order_by(Artist.name, Artist.id)
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    plan = ' '.join(row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)))
+    assert 'ix_artists_initial_name_id' in plan
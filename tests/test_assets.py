@@ -0,0 +1,42 @@
+import json
+import os
+import time
+
+from assets import prune
+
+
+def write(dist, name, age_days=0):
+    path = os.path.join(dist, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(name)
+    written = time.time() - age_days * 24 * 60 * 60
+    os.utime(path, (written, written))
+
+
+def test_prune_keeps_current_and_recent_outputs(app, tmp_path, monkeypatch):
+    dist = str(tmp_path)
+    monkeypatch.setitem(app.config, 'ASSETS_DIST', dist)
+    with open(os.path.join(dist, 'manifest.json'), 'w') as file:
+        json.dump({
+            'files': {'css/bundle.css': 'css/bundle.1111111111.css'},
+            'images': {'img/a.jpg': [{'path': 'img/a-480w.3333333333.jpg', 'width': 480, 'type': 'image/jpeg'}]},
+        }, file)
+    # the current build, written long ago when nothing changed since
+    write(dist, 'css/bundle.1111111111.css', age_days=30)
+    write(dist, 'css/bundle.1111111111.css.gz', age_days=30)
+    write(dist, 'img/a-480w.3333333333.jpg', age_days=30)
+    # an earlier build, still within the grace period
+    write(dist, 'css/bundle.2222222222.css', age_days=1)
+    # an earlier build past it
+    write(dist, 'css/bundle.0000000000.css', age_days=30)
+    write(dist, 'css/bundle.0000000000.css.gz', age_days=30)
+    write(dist, 'css/bundle.0000000000.css.br', age_days=30)
+
+    assert sorted(prune(app, 7)) == [
+        'css/bundle.0000000000.css', 'css/bundle.0000000000.css.br', 'css/bundle.0000000000.css.gz',
+    ]
+    assert sorted(os.listdir(os.path.join(dist, 'css'))) == [
+        'bundle.1111111111.css', 'bundle.1111111111.css.gz', 'bundle.2222222222.css',
+    ]
+    assert os.listdir(os.path.join(dist, 'img')) == ['a-480w.3333333333.jpg']
@@ -0,0 +1,16 @@
+import time
+from datetime import datetime
+
+from models import Show
+from commands import convert
+
+
+def test_load_converts_offset_times_to_local_time(app, monkeypatch):
+    monkeypatch.setenv('TZ', 'America/Los_Angeles')
+    time.tzset()
+    try:
+        assert convert(Show.__table__.c.start_time, '2030-06-01T20:00:00+00:00') == datetime(2030, 6, 1, 13, 0)
+        assert convert(Show.__table__.c.start_time, '2030-06-01 20:00') == datetime(2030, 6, 1, 20, 0)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
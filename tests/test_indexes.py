@@ -0,0 +1,55 @@
+import importlib.util
+import os
+from datetime import datetime
+
+import pytest
+from alembic.runtime.migration import MigrationContext
+from alembic.operations import Operations
+
+from models import db, Venue
+from catalog import catalog_filters, venue_areas_query, venue_detail_queries, artist_detail_queries
+
+MIGRATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations', 'versions', '3c1f7a9d2b54_.py')
+
+
+def load_migration():
+    spec = importlib.util.spec_from_file_location('show_indexes_migration', MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def query_plan(statement):
+    # SQLite's EXPLAIN QUERY PLAN of a statement, as one string
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    return ' | '.join(row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)))
+
+
+@pytest.fixture
+def migrated(app):
+    # the tables as create_all made them, less the indexes the migration adds
+    migration = load_migration()
+    with Operations.context(MigrationContext.configure(db.session.connection())):
+        migration.downgrade()
+        yield migration
+
+
+def test_migration_indexes_serve_detail_and_area_queries(migrated):
+    now = datetime.now()
+    statements = {
+        'ix_show_venue_id_start_time': venue_detail_queries(1, 1, now),
+        'ix_show_artist_id_start_time': artist_detail_queries(1, 1, now),
+    }
+
+    for index, queries in statements.items():
+        for name in ('upcoming', 'past', 'past_shows_count'):
+            assert index not in query_plan(queries[name])
+    areas = venue_areas_query(*catalog_filters(Venue, city='San Francisco', state='CA'))
+    assert 'ix_venues_city_state' not in query_plan(areas)
+
+    migrated.upgrade()
+
+    for index, queries in statements.items():
+        for name in ('upcoming', 'past', 'past_shows_count'):
+            assert index in query_plan(queries[name]), name
+    assert 'ix_venues_city_state' in query_plan(areas)
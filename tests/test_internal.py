@@ -0,0 +1,21 @@
+def test_pool_needs_the_token_when_one_is_set(client, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'INTERNAL_TOKEN', 's3cret')
+
+    assert client.get('/internal/pool').status_code == 404
+    assert client.get('/internal/pool', headers={'Authorization': 'Bearer wrong'}).status_code == 404
+    response = client.get('/internal/pool', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    assert 'pool' in response.get_json()
+
+
+def test_pool_is_off_in_production_without_a_token(client, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'INTERNAL_TOKEN', None)
+    assert client.get('/internal/pool').status_code == 200
+
+    monkeypatch.setitem(client.application.config, 'PRODUCTION', True)
+    assert client.get('/internal/pool').status_code == 404
+
+
+def test_pool_is_only_answered_for_internal_hosts(client):
+    response = client.get('/internal/pool', environ_base={'REMOTE_ADDR': '203.0.113.7'})
+    assert response.status_code == 404
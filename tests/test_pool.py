@@ -0,0 +1,33 @@
+import sqlite3
+
+from sqlalchemy.pool import QueuePool
+
+from models import MeteredQueuePool, in_memory_sqlite
+
+
+def test_in_memory_sqlite_urls():
+    assert in_memory_sqlite('sqlite://')
+    assert in_memory_sqlite('sqlite:///:memory:')
+    assert in_memory_sqlite('sqlite:///file:fyyur?mode=memory&uri=true')
+    assert not in_memory_sqlite('sqlite:////tmp/fyyur.db')
+    assert not in_memory_sqlite('postgresql://localhost/fyyur')
+
+
+def test_checkout_retried_by_queue_pool_is_counted_once(monkeypatch):
+    pool = MeteredQueuePool(lambda: sqlite3.connect(':memory:'), pool_size=1, max_overflow=0)
+    do_get = QueuePool._do_get
+    retried = []
+
+    def lose_overflow_race(self):
+        # QueuePool retries through self._do_get() when another thread
+        # takes the overflow slot first
+        if not retried:
+            retried.append(True)
+            return self._do_get()
+        return do_get(self)
+
+    monkeypatch.setattr(QueuePool, '_do_get', lose_overflow_race)
+    pool.connect().close()
+
+    assert retried
+    assert pool.metrics()['checkouts'] == 1
@@ -0,0 +1,52 @@
+from difflib import SequenceMatcher
+
+from models import db, Artist, Genre
+from search import TrigramSearch, prefix_index
+
+
+def complete(client, prefix):
+    return [artist['name'] for artist in client.get('/api/v1/autocomplete/artists?q=' + prefix).get_json()]
+
+
+def test_autocomplete_sees_committed_artists(client):
+    db.session.add(Artist(name='Wild Sax Band'))
+    db.session.commit()
+    assert complete(client, 'sax') == ['Wild Sax Band']
+
+    db.session.add(Artist(name='Saxophone Trio'))
+    db.session.commit()
+    assert complete(client, 'sax') == ['Saxophone Trio', 'Wild Sax Band']
+
+
+def test_autocomplete_index_expires(client, monkeypatch):
+    assert complete(client, 'wild') == []
+    # a write the events don't see, such as one in another process
+    db.session.execute(Artist.__table__.insert(), {'name': 'Wild Sax Band'})
+    db.session.commit()
+    assert complete(client, 'wild') == []
+
+    monkeypatch.setattr(prefix_index, 'ttl', 0)
+    assert complete(client, 'wild') == ['Wild Sax Band']
+
+
+def test_trigram_search_matches_columns_and_genres(app):
+    # stand-ins for pg_trgm's similarity() and PostgreSQL's greatest()
+    connection = db.session.connection().connection.driver_connection
+    connection.create_function('similarity', 2, lambda a, b: SequenceMatcher(None, (a or '').lower(), b.lower()).ratio())
+    connection.create_function('greatest', -1, max)
+    db.session.add_all([
+        Artist(name='Jazz Cats', city='Boston', genres=Genre.named(['Jazz'])),
+        Artist(name='Rockers', city='Jazzville', genres=Genre.named(['Rock'])),
+        Artist(name='Quiet Storm', city='Austin', genres=Genre.named(['Acid Jazz'])),
+        Artist(name='Nobody', city='Dallas'),
+    ])
+    db.session.flush()
+    names = dict(db.session.query(Artist.id, Artist.name))
+
+    ids, count = TrigramSearch().search(Artist, 'jazz', 10, 0)
+    assert [names[id] for id in ids] == ['Jazz Cats', 'Quiet Storm', 'Rockers']
+    assert count == 3
+
+    ids, count = TrigramSearch().search(Artist, 'jazz', 10, 0, genre='Rock')
+    assert [names[id] for id in ids] == ['Rockers']
+    assert count == 1
@@ -0,0 +1,47 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from models import db, Venue, Artist, Show
+
+
+def add_venue_and_artist():
+    venue = Venue(name='Venue', city='San Francisco', state='CA')
+    artist = Artist(name='Artist')
+    db.session.add_all([venue, artist])
+    db.session.commit()
+    return venue.id, artist.id
+
+
+def test_series_accepts_the_placeholder_format(client):
+    venue_id, artist_id = add_venue_and_artist()
+    response = client.post('/shows/series', data={
+        'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2030-01-01 20:00', 'every_days': 7, 'count': 3
+    })
+    assert response.status_code == 200
+    assert [show.start_time for show in Show.query.order_by(Show.start_time)][0] == datetime(2030, 1, 1, 20, 0)
+
+
+def test_series_shows_field_errors(client):
+    venue_id, artist_id = add_venue_and_artist()
+    response = client.post('/shows/series', data={
+        'venue_id': venue_id, 'artist_id': artist_id, 'start_time': 'next friday', 'every_days': 7, 'count': 3
+    })
+    assert response.status_code == 400
+    assert b'Not a valid datetime value' in response.data
+
+
+def test_batch_stores_offset_times_as_local_time(client, monkeypatch):
+    monkeypatch.setenv('TZ', 'America/Los_Angeles')
+    time.tzset()
+    try:
+        venue_id, artist_id = add_venue_and_artist()
+        started = datetime.now().replace(microsecond=0) - timedelta(hours=2)
+        response = client.post('/api/v1/shows/batch', json={'shows': [{
+            'venue_id': venue_id, 'artist_id': artist_id, 'start_time': started.astimezone(timezone.utc).isoformat()
+        }]})
+        assert response.status_code == 201
+        assert Show.query.one().start_time == started
+        assert db.session.get(Venue, venue_id).upcoming_shows_count == 0
+    finally:
+        monkeypatch.undo()
+        time.tzset()
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from models import db, Venue, Artist, Show, Genre
+from cache import page_cache
+from instrumentation import assert_max_queries
+from catalog import venue_detail
+import counters
+
+
+def add_venues(count, start=0):
+    # venues in three areas, each with an upcoming and a past show
+    artist = Artist(name='Artist {}'.format(start), city='San Francisco', state='CA')
+    now = datetime.now()
+    for number in range(start, start + count):
+        venue = Venue(name='Venue {}'.format(number), city='City {}'.format(number % 3), state='CA', genres=Genre.named(['Jazz']))
+        db.session.add_all([
+            Show(venues=venue, artist=artist, start_time=now + timedelta(days=1)),
+            Show(venues=venue, artist=artist, start_time=now - timedelta(days=1)),
+        ])
+    db.session.commit()
+
+
+def venues_queries(client):
+    # statements run by an uncached /venues
+    page_cache.backend.clear()
+    with assert_max_queries(20) as stats:
+        response = client.get('/venues')
+    assert response.status_code == 200
+    return stats.count
+
+
+def test_venues_query_count_does_not_grow_with_venues(client):
+    add_venues(3)
+    queries = venues_queries(client)
+
+    add_venues(30, start=3)
+    page_cache.backend.clear()
+    with assert_max_queries(queries):
+        response = client.get('/venues')
+    assert response.status_code == 200
+    for number in range(33):
+        assert 'Venue {}<'.format(number).encode() in response.data
+
+
+def test_new_genre_refreshes_the_venue_filters(client):
+    add_venues(1)
+    assert b'Blues' not in client.get('/venues').data
+    db.session.add(Artist(name='Blues Artist', genres=Genre.named(['Blues'])))
+    db.session.commit()
+    assert b'Blues' in client.get('/venues').data
+
+
+def test_show_starting_now_is_past_everywhere(app):
+    now = datetime.now().replace(microsecond=0)
+    venue = Venue(name='Venue', city='San Francisco', state='CA')
+    db.session.add(Show(venues=venue, artist=Artist(name='Artist'), start_time=now))
+    db.session.commit()
+    counters.reconcile(now)
+
+    data = venue_detail(venue.id, 1, now)
+    assert data['upcoming_shows_count'] == db.session.get(Venue, venue.id).upcoming_shows_count == 0
+    assert data['past_shows_count'] == 1
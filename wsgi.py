@@ -0,0 +1,18 @@
+import os
+
+#----------------------------------------------------------------------------#
+# Production WSGI entry point: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# gunicorn.conf.py preloads this module in the master process, so the app,
+# its imports and the compiled templates below are built once and shared
+# with the forked workers copy-on-write. Templates come from the bytecode
+# cache of `flask assets build` when there is one.
+#----------------------------------------------------------------------------#
+
+# serving only, no CLI setup (see LAZY_STARTUP in config.py)
+os.environ.setdefault('LAZY_STARTUP', 'true')
+
+from app import app
+from assets import compile_templates
+
+compile_templates(app)